@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import copy
+import platform
+import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from src.animator import Animator
+from src.renderer import available_cpus
+from src.profiler import peak_rss_mb
+
+DATA_DIR = os.path.join("benchmarks", "data")                           # generated maps, reused between runs
+ROAD_COLOR = [0, 0, 255]                                                # route color in the road maps
+CASES = {                                                               # synthetic cases of increasing size
+    "small":  {"map": [1024, 1024], "route": 2000,  "figure": [480, 270]},
+    "medium": {"map": [2048, 2048], "route": 8000,  "figure": [960, 540]},
+    "large":  {"map": [4096, 4096], "route": 32000, "figure": [1920, 1080]},
+}
+STAGES = ["load", "extract_greedy", "extract_skeleton",                 # pipeline stages to time
+          "render", "gif", "mp4"]
+
+def make_route(size:list, length:int, seed:int=0) -> np.ndarray:
+    """ function to generate a smooth random route that stays inside a map
+    args: (1) size: list containing the map width and height
+          (2) length: int route length, in pixels
+          (3) seed: int random seed, so that cases are reproducible
+    rets: (1) xy: int array containing one point per pixel travelled """
+
+    rng = np.random.default_rng(seed)                                   # reproducible route
+    w, h = size                                                         # map size
+    margin = 0.1*min(w, h)                                              # distance kept from the edges
+    pos, heading = np.array([margin, h/2]), 0.0                         # start on the west side, heading east
+    xy = [pos.copy()]
+    while len(xy) < length:                                             # one pixel per step
+        to_centre = np.arctan2(h/2 - pos[1], w/2 - pos[0])              # direction of the map centre
+        near_edge = min(pos[0], pos[1], w - pos[0], h - pos[1]) < margin
+        turn = np.angle(np.exp(1j*(to_centre - heading)))               # signed angle towards the centre
+        heading += rng.normal(0, 0.05) + (0.1*turn if near_edge else 0) # wander, but steer away from edges
+        pos = pos + [np.cos(heading), np.sin(heading)]                  # advance one pixel
+        xy.append(pos.copy())
+    return np.round(xy).astype(np.int32)
+
+def make_case(name:str, size:list, length:int) -> dict:
+    """ function to write the maps and path of a synthetic case, unless they exist
+    args: (1) name: str containing the case name
+          (2) size: list containing the map width and height
+          (3) length: int route length, in pixels
+    rets: (1) files: dict containing the map_back, map_road and path_road files """
+
+    folder = os.path.join(DATA_DIR, f"{name}_{size[0]}x{size[1]}_{length}")
+    files = {"map_back": os.path.join(folder, "map_back.png"),          # background map
+             "map_road": os.path.join(folder, "map_road.png"),          # road map
+             "path_road": os.path.join(folder, "path_road.npy")}        # exact route
+    if all(os.path.exists(f) for f in files.values()):                  # generated before
+        return files
+
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(length)                                 # reproducible scenery
+    xy = make_route(size, length)                                       # route to animate
+    back = np.full((size[1], size[0], 3), 235, np.uint8)                # land
+    for _ in range(size[0]*size[1]//100000 + 1):                        # scattered fields and lakes
+        centre = rng.integers(0, size, 2).tolist()                      # patch position
+        axes = rng.integers(20, max(21, min(size)//8), 2).tolist()      # patch size
+        color = rng.integers(120, 230, 3).tolist()                      # patch color
+        cv2.ellipse(back, centre, axes, rng.uniform(0, 180), 0, 360, color, -1)
+    road = np.full_like(back, 255)                                      # white road map
+    cv2.polylines(back, [xy], isClosed=False, color=(90, 90, 90), thickness=5)
+    cv2.polylines(road, [xy], isClosed=False, color=ROAD_COLOR, thickness=3)
+    cv2.imwrite(files["map_back"], cv2.cvtColor(back, cv2.COLOR_RGB2BGR))
+    cv2.imwrite(files["map_road"], cv2.cvtColor(road, cv2.COLOR_RGB2BGR))
+    np.save(files["path_road"], xy)
+    return files
+
+def case_config(base:dict, files:dict, figure:list, frames:int, output:str,
+                workers:int=1) -> dict:
+    """ function to build the headless configuration of a benchmark case
+    args: (1) base: dict containing the base configuration
+          (2) files: dict containing the map_back, map_road and path_road files
+          (3) figure: list containing the output figure size, or None to
+                      keep the base one
+          (4) frames: int number of frames to render
+          (5) output: str containing the output file name, without extension
+          (6) workers: int number of render processes (0 for one per
+                       usable core)
+    rets: (1) config: dict containing the case configuration """
+
+    config = copy.deepcopy(base)                                        # leave the base untouched
+    config["cache"] = ""                                                # always extract from scratch
+    config["maps"] = {"map_back": files["map_back"], "map_road": files["map_road"]}
+    config["path"]["path_road"] = files["path_road"]                    # exact route
+    config["output"].update({"frames": frames, "duration": 0,           # fixed number of frames
+                             "filename": output, "workers": workers})
+    config["display"]["renderer"] = "opencv"                            # headless rendering
+    if figure:                                                          # case figure size
+        fov = np.array(config["display"]["FoV"])*figure[0]/config["display"]["figure_size"][0]
+        config["display"]["figure_size"] = figure                       # same zoom, larger frames
+        config["display"]["FoV"] = np.round(fov).astype(int).tolist()
+    return config
+
+def run_stage(config:dict, stage:str) -> dict:
+    """ function to run one pipeline stage of a benchmark case
+    args: (1) config: dict containing the case configuration
+          (2) stage: str name of the stage (see STAGES)
+    rets: (1) result: dict containing the wall time, number of frames,
+                      output file size and peak memory of the stage
+    note: meant to run in a fresh process, so that peak memory only
+          accounts for the stage itself """
+
+    a = Animator(config)                                                # animator for this case
+    frames, output = 0, ""                                              # rendered frames and output file
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null), contextlib.redirect_stderr(null):
+        if stage in ["render", "gif", "mp4"]:                           # path is an input, not timed
+            path = np.asarray(a._load(config["path"]["path_road"], m_type="path"))
+            a._bitmap("map_back")                                       # nor is decoding the map
+            frames = len(a._track(path)[0])                             # frames to render
+        start = time.perf_counter()
+        if stage == "load":                                             # decode the background map
+            a._bitmap("map_back")
+        elif stage.startswith("extract_"):                              # path extraction, by method
+            config["path"]["extraction"] = stage[len("extract_"):]      # "greedy" or "skeleton"
+            a.extract_paths("map_road", {"path": ROAD_COLOR})
+        elif stage == "render":                                         # render without saving
+            config["output"]["mode"] = "preview"
+            a.animate(["map_back"], path)
+        else:                                                           # render and encode
+            config["output"]["mode"] = "save"
+            config["output"]["filename"] += f".{stage}"                 # output format
+            output = a.animate(["map_back"], path)
+        wall = time.perf_counter() - start
+    size = os.path.getsize(output) if output else None                  # encoded file size
+    if output:                                                          # keep the data folder small
+        os.remove(output)
+    return {"wall_s": round(wall, 4), "frames": frames or None,
+            "fps": round(frames/wall, 2) if frames else None,
+            "peak_rss_mb": peak_rss_mb(), "file_bytes": size}
+
+def benchmark(cases:list, stages:list, frames:int, base:dict, workers:int=1) -> dict:
+    """ function to run every stage of every case, each in its own process
+    args: (1) cases: list of case names, including "resources"
+          (2) stages: list of stage names
+          (3) frames: int number of frames to render per case
+          (4) base: dict containing the base configuration
+          (5) workers: int number of render processes per case
+    rets: (1) report: dict containing the environment and the results """
+
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),          # run metadata
+              "python": platform.python_version(), "numpy": np.__version__,
+              "opencv": cv2.__version__, "machine": platform.machine(),
+              "cpus": available_cpus(), "workers": workers,
+              "frames": frames, "results": []}
+    ctx = multiprocessing.get_context("spawn")                          # fresh interpreter per stage
+    for name in cases:                                                  # iterate over cases
+        if name == "resources":                                         # shipped example, the baseline
+            files = {"map_back": "resources/map_back.png", "map_road": "resources/map_road.png",
+                     "path_road": "resources/path_road.dat"}
+            case = {"map": list(cv2.imread(files["map_back"]).shape[1::-1]),
+                    "route": len(np.loadtxt(files["path_road"])), "figure": None}
+        else:                                                           # synthetic case
+            case = CASES[name]
+            files = make_case(name, case["map"], case["route"])
+        os.makedirs(DATA_DIR, exist_ok=True)
+        output = os.path.join(DATA_DIR, f"{name}_output")               # encoded animation file
+        config = case_config(base, files, case["figure"], frames, output, workers)
+        for stage in stages:                                            # iterate over stages
+            with ProcessPoolExecutor(1, mp_context=ctx) as pool:        # isolated process
+                result = pool.submit(run_stage, config, stage).result()
+            result = {"case": name, "stage": stage, "map": case["map"], # describe the case
+                      "route": case["route"], "figure": config["display"]["figure_size"], **result}
+            report["results"].append(result)
+            cell = lambda key, fmt: "-" if result[key] is None else format(result[key], fmt)
+            print(f"{name:>10} {stage:>16} {cell('wall_s', '.3f'):>9} s {cell('fps', '.1f'):>8} fps"
+                  f" {cell('peak_rss_mb', '.1f'):>8} MB {cell('file_bytes', 'd'):>10} B")
+    return report
+
+def compare(report:dict, previous:dict) -> None:
+    """ function to print the change of each result against a previous run
+    args: (1) report: dict containing the current results
+          (2) previous: dict containing the previous results
+    rets: none """
+
+    old = {(r["case"], r["stage"]): r for r in previous["results"]}     # previous results by case and stage
+    print(f"\n{'case':>10} {'stage':>16} {'time':>8} {'memory':>8} {'size':>8}")
+    for r in report["results"]:                                         # iterate over current results
+        p = old.get((r["case"], r["stage"]))                            # same case and stage
+        if p is None:                                                   # not run before
+            continue
+        ratio = lambda key: (f"{r[key]/p[key]:>7.2f}x" if r[key] and p[key] else f"{'-':>8}")
+        print(f"{r['case']:>10} {r['stage']:>16} {ratio('wall_s')} {ratio('peak_rss_mb')} {ratio('file_bytes')}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the map animator pipeline stages.")
+    parser.add_argument("--cases", nargs="+", default=["resources", *CASES],
+                        choices=["resources", *CASES], help="cases to run, from smallest to largest")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES,
+                        help="pipeline stages to time")
+    parser.add_argument("--frames", type=int, default=200, help="frames rendered per case")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="render processes per case (0 for one per usable core)")
+    parser.add_argument("--config", default="config.json", help="base configuration file")
+    parser.add_argument("--output", default="", help="json file to write the results to")
+    parser.add_argument("--compare", default="", help="json file of a previous run to compare with")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as file:                                # open file in read
+        base = json.load(file)                                          # base configuration
+    report = benchmark(args.cases, args.stages, args.frames, base,      # run benchmarks
+                       args.workers)
+    if args.output:                                                     # machine-readable results
+        with open(args.output, 'w') as file:                            # open file in write
+            json.dump(report, file, indent=2)
+    if args.compare:                                                    # previous run to compare with
+        with open(args.compare, 'r') as file:                           # open file in read
+            compare(report, json.load(file))
@@ -1,16 +1,22 @@
 # launch script begin
 from src.animator import Animator
+from src.batch import run_batch
 
-a = Animator()                                                          # instantiate Animator object
+if __name__ == "__main__":                                              # not when imported by render workers
+    a = Animator()                                                      # instantiate Animator object
 
-if a.get_config()["mode"] == "generate":                                # option execute path generation
-    a.generate_path("map_road")                                         # generate path dataset
+    if a.get_config()["mode"] == "generate":                            # option execute path generation
+        a.generate_path("map_road")                                     # generate path dataset
 
-elif a.get_config()["mode"] == "animate":                               # option to execute animation build
-    a.build_animation()                                                 # build animation
+    elif a.get_config()["mode"] == "animate":                           # option to execute animation build
+        a.build_animation()                                             # build animation
 
-elif a.get_config()["mode"].lower() == "cli":                           # option to launch the CLI app
-    a. launch_cli()                                                     # launch the CLI app
+    elif a.get_config()["mode"] == "batch":                             # option to render a batch of jobs
+        run_batch(a.get_config()["batch"]["manifest"],                  # render every job in the manifest
+                  config=a.get_config())                                # on top of this configuration
 
-else:                                                                   # invalid option
-    pass                                                                # used for external module consumption
+    elif a.get_config()["mode"].lower() == "cli":                       # option to launch the CLI app
+        a. launch_cli()                                                 # launch the CLI app
+
+    else:                                                               # invalid option
+        pass                                                            # used for external module consumption
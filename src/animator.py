@@ -1,26 +1,46 @@
+import os
 import json
+import hashlib
+import shutil
+import tempfile
+import weakref
+import threading
+from concurrent.futures import Future
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 import tkinter as tk
 from tkinter import filedialog
-from PIL import Image
-import imageio
 from tqdm import tqdm
+from src.renderer import FrameRenderer, render_parallel
+from src.ordering import nearest_neighbour_order
+from src.encoder import VIDEO_CODECS, open_writer, abort_writer, build_palette
+from src.tiles import TiledMap
+from src.skeleton import extract_routes
+from src.profiler import Profiler
+
+_assets_lock = threading.Lock()                                         # guards insertions into shared assets
 
 class Animator:
     
     # class constructor
 
-    def __init__(self) -> None:
-        """ a class that allows animating a moving point over a map """
+    def __init__(self, config="config.json", assets:dict=None) -> None:
+        """ a class that allows animating a moving point over a map
+        args: (1) config: str containing the config file name, or config dict
+              (2) assets: dict of loaded maps and paths to share with other
+                          Animator instances, keyed by file and modification
+                          time, so that unchanged files are never reloaded """
 
         # private class members 
         
-        self._config =  self._load("config.json", m_type="json")        # load config file
-        self._bitmaps = {                                               # dict of bitmaps
-            map_name:self._load(path, m_type="image")                   # import from each file
-            for map_name, path in self._config["maps"].items()}         # in the config file
+        if isinstance(config, str):                                     # config file
+            config = self._load(config, m_type="json")                  # load config file
+        self._config = config                                           # configuration dict
+        self._assets = {} if assets is None else assets                 # maps and paths, loaded on first use
+        profile = config.get("profile", {})                             # instrumentation settings
+        self._profile = Profiler(profile.get("enabled", False),         # per-stage timings
+                                 memory=profile.get("memory", False))   # and memory peaks
         
         plt.rcParams['toolbar'] = 'None'                                # hide mpl toolbar
 
@@ -61,7 +81,7 @@ class Animator:
             r = self._get_user_response(question, options=options)      # get user response
             
             if not r == "q":                                            # user did not quit
-                self.__init__()                                         # reload data and parameters
+                self.__init__(assets=self._assets)                      # reload parameters and changed files
 
         print("Goodbye!")                                               # say goodbye to user
 
@@ -72,47 +92,222 @@ class Animator:
         rets: (1) xy: array containing xy coordinates of the identified
                       path
         note: after a successful execution, the user is prompted to
-              store the generated coordinate array into a text file """
+              store the generated coordinate array into a data file;
+              paths are cached by map content and path/filter settings """
 
         color = self._config["path"]["color"]                           # user-defined color for path
-        mat = self._bitmaps[im]                                         # image matrix
-        axis = color.index(max(color))                                  # most relevant axis
-        mask = np.all(mat == color, axis=axis)                          # color-filtering mask
-        xy = np.array(np.where(mask)[::-1]).T                           # determine path coordinates
-        
-        xy = self._filter_position(xy)                                  # apply positional filter
+        xy = self.extract_paths(im, {"path": color})["path"]            # extract path from the map
         self._show(xy, m_type="line")                                   # show identified path
         
         query = "Save coordinates to data file?"                        # question to ask user
         if self._get_user_response(query).lower() == "y":               # ask user if to save file
             self._save(xy, m_type="line")                               # save to file
         plt.clf()                                                       # clear plotted figure
+        self._export_profile()                                          # write profiling report
         return xy
     
+    def extract_paths(self, im:str, colors:dict=None) -> dict:
+        """ method to extract color-keyed paths from an input bitmap, without
+        prompting the user
+        args: (1) im: str containing the name of the image that encodes
+                      the paths to follow
+              (2) colors: dict of name -> [r, g, b] color of each path,
+                          defaults to the path->routes configuration
+        rets: (1) paths: dict of name -> array of xy path coordinates
+        note: paths are cached by map content and path/filter settings;
+              with the "skeleton" extraction, all uncached paths are
+              extracted from the same pass over the image """
+
+        path_config = self._config["path"]                              # path settings
+        if colors is None:                                              # use configured routes
+            colors = path_config.get("routes") or {"path": path_config["color"]}
+        method = path_config.get("extraction", "greedy")                # path extraction method
+        direction = path_config["starting_direction"]                   # get starting direction
+        settings = {"starting_direction": direction,                    # settings that affect
+                    "filters": self._config["filters"],                 # the extracted paths
+                    "extraction": method}
+
+        paths, missing = {}, {}                                         # cached and uncached paths
+        for name, color in colors.items():                              # iterate over paths
+            cache = self._cache_file("path", self._config["maps"][im],  # cache entry for this map
+                                     {"color": color, **settings})      # and path settings
+            if os.path.exists(cache):                                   # path was generated before
+                paths[name] = self._load(cache, m_type="path")          # reuse it
+                print(f"Loaded cached path from '{cache}'")             # notify user
+            else:                                                       # extract it
+                missing[name] = (color, cache)
+
+        if missing and method == "skeleton":                            # trace road skeletons
+            gap = self._config["filters"]["diff_threshold"]             # largest gap to jump over
+            mat = self._bitmap(im)                                      # image matrix
+            with self._profile.stage("extract", routes=len(missing)):   # thin and walk the roads
+                found = extract_routes(mat,                             # all colors in one pass
+                                       {n: c for n, (c, _) in missing.items()}, direction, gap)
+        elif missing:                                                   # greedy nearest-neighbor ordering
+            found = {}                                                  # extracted paths
+            mat = self._bitmap(im)                                      # image matrix
+            for name, (color, _) in missing.items():                    # one color at a time
+                with self._profile.stage("extract", route=name):        # find the road pixels
+                    axis = color.index(max(color))                      # most relevant axis
+                    mask = np.all(mat == color, axis=axis)              # color-filtering mask
+                    xy = np.array(np.where(mask)[::-1]).T               # determine path coordinates
+                with self._profile.stage("filter", route=name):         # order and filter them
+                    found[name] = self._filter_position(xy)             # apply positional filter
+        for name, (color, cache) in missing.items():                    # newly extracted paths
+            paths[name] = found[name]                                   # add to output
+            self._store(cache, found[name])                             # cache for the next run
+        return {name: paths[name] for name in colors}                   # in the requested order
+
     def build_animation(self):
         """ method to load the default map files and launch the animation building function
         args: none
         rets: none """
 
-        filename = self._config["path"]["path_road"]                    # get file name from config
-        road = self._load(filename, m_type="path")                      # import path dataset
+        road = self.load_assets(["map_back"])                           # import maps and path dataset
         self.animate(["map_back"], road)                                # launch animation
+
+    def load_assets(self, ims:list, route:str=None) -> np.ndarray:
+        """ method to load the maps and the path an animation needs
+        args: (1) ims: list of images to show stacked
+              (2) route: str name of a path->routes entry to extract from
+                         map_road ("path" for path->color), or None to load
+                         the path->path_road data file
+        rets: (1) path: array containing the trajectory to follow
+        note: everything is kept in the shared assets, so calling this
+              again, from any Animator sharing them, is instant """
+
+        [self._background(im) for im in ims]                            # decode or open each map
+        if route is None:                                               # pre-generated path
+            return self._asset("path", self._config["path"]["path_road"])
+        key = ("route", route, json.dumps(                              # extraction inputs
+            [self._config["path"], self._config["filters"]], sort_keys=True))
+        road = self._config["maps"]["map_road"]                         # road map file name
+        return self._asset(key, road, lambda: self.extract_paths("map_road")[route])
     
-    def animate(self, ims:list, path:np.ndarray=np.array([[0,0]])) -> None:
+    def animate(self, ims:list, path:np.ndarray=np.array([[0,0]])) -> str:
         """ method to create image animation
         args: (1) ims: list of images to show stacked
               (2) path: array containing the trajectory to follow
-        rets: none
-        note: after a successful execution, the user is prompted to
-              store the generated animation into a gif file """
+        rets: (1) filename: str containing the saved animation file name,
+                            or an empty string if it was not saved
+        note: in save mode, the user is prompted for the animation file
+              before rendering starts, and frames are written as they come """
 
-        skip = self._config["output"]["skip"]                           # points to skip from the original dataset
         output_mode = self._config["output"]["mode"]                    # save or show mode
+        renderer = self._config["display"].get("renderer", "opencv")    # frame rendering backend
+        workers = self._config["output"].get("workers", 1)              # number of render processes
+        with self._profile.stage("camera"):                             # camera maths
+            ends, cams = self._track(path)                              # trail length and camera per frame
+
+        if renderer == "opencv" and workers != 1:                       # parallel headless rendering
+            frames = render_parallel(self._background(ims[-1]),         # render over the topmost map
+                                     self._config["display"], path,     # with the display settings
+                                     ends, cams, workers=workers)       # on a process pool
+        else:                                                           # rendering in this process
+            if renderer == "opencv":                                    # headless rendering
+                draw = self._setup_opencv(ims)                          # set up headless frame renderer
+            else:                                                       # interactive rendering
+                draw = self._setup_matplotlib(ims, path)                # set up matplotlib figure
+            frames = (draw(path[:n], cam) for n, cam in zip(ends, cams))# lazily rendered frames
+        frames = self._profile.iterate("render", frames)                # time each frame, if profiling
+        frames = tqdm(frames, total=len(ends))                          # report progress
+        if self._profile.enabled and self._config["profile"].get("live", False):
+            frames = self._profile.live(frames)                         # stage timings next to the bar
+
+        filename = self._config["output"].get("filename", "")           # filename to save animation
+        
+        if output_mode == "save":                                       # output to file
+            filename = self._save(frames,                               # stream frames to file
+                                    filename=filename,                  # save frame to specified filename
+                                    background=ims[-1])                 # for the shared gif palette
+        else:                                                           # preview only
+            for frame in frames:                                        # render each frame
+                pass                                                    # and discard it
+            filename = ""                                               # nothing saved
+        self._export_profile()                                          # write profiling report
+        return filename
+
+    # private methods
+
+    def _track(self, path:np.ndarray) -> tuple:
+        """ method to precompute the trail length and camera position of every frame
+        args: (1) path: array containing the trajectory to follow
+        rets: (1) ends: int array containing the trail length of each frame
+              (2) cams: array containing the camera position of each frame
+        note: the camera is a weighted average of the path points travelled
+              over the camera_smooth frames around each frame, or the head
+              of the trail when camera_smooth is 0 """
+
+        smooth = max(0, self._config["display"]["camera_smooth"])       # smoothing coefficient for camera motion
+        kernel = self._config["display"].get("camera_kernel", "box")    # camera smoothing kernel
+
+        n = len(path)                                                   # number of path points
+        progress, total = self._resample(path)                          # frame to path index mapping
+        R = 2*smooth if kernel == "gaussian" else smooth                # kernel radius, in frames
+        ks = np.arange(-R, total + R + 1)                               # frames, padded for the kernel
+        idx = np.clip(progress(ks), 0, n)                               # trail length at each frame
+        ends = idx[R:R+total]                                           # trail length of each frame
+        head = path[np.clip(ends, 1, n) - 1]                            # last travelled point
+        if R == 0:                                                      # no smoothing
+            return ends, head.astype(float)                             # camera follows the head
+
+        C = np.concatenate(([[0, 0]], np.cumsum(path, axis=0, dtype=float)))# cumulative sum of path points
+        S = C[idx[1:]] - C[idx[:-1]]                                    # sum of points travelled per frame
+        c = np.diff(idx).astype(float)                                  # number of points travelled per frame
+        if kernel == "gaussian":                                        # gaussian weights
+            d = np.arange(-R, R) + 0.5                                  # frame offsets of each step
+            w = np.exp(-0.5*(d/max(smooth/2, 1e-9))**2)                 # sigma of half camera_smooth
+        else:                                                           # uniform weights
+            w = np.ones(2*R)                                            # box average
+        den = np.correlate(c, w, mode="valid")[:total]                  # weighted point count
+        cams = head.astype(float)                                       # camera falls back to the head
+        valid = den > 0                                                 # frames with points to average
+        for axis in range(2):                                           # smooth x and y
+            num = np.correlate(S[:, axis], w, mode="valid")[:total]     # weighted coordinate sum
+            cams[valid, axis] = num[valid]/den[valid]                   # weighted average
+        return ends, cams
+
+    def _resample(self, path:np.ndarray) -> tuple:
+        """ method to determine how far along the path each frame is
+        args: (1) path: array containing the trajectory to follow
+        rets: (1) progress: function mapping frame numbers to the (unclipped)
+                            number of travelled path points
+              (2) total: int number of frames
+        note: by default, frames advance a fixed number of path points
+              (skip); the speed, frames or duration settings instead
+              advance a fixed distance along the path """
+
+        output = self._config["output"]                                 # output settings
+        skip = output["skip"]                                           # points to skip from the original dataset
+        frames = output.get("frames", 0)                                # target number of frames
+        if frames:                                                      # first and last frame at least
+            frames = max(2, frames)
+        if output.get("duration", 0):                                   # target animation duration
+            frames = max(2, round(output["duration"]/output["frame_duration"]))
+        s = np.concatenate(([0], np.cumsum(                             # arc length at each path point
+            np.linalg.norm(np.diff(path, axis=0), axis=1))))            # from the start of the path
+
+        step = output.get("speed", 0)                                   # path pixels travelled per frame
+        if frames:                                                      # fixed number of frames
+            step = s[-1]/(frames - 1)                                   # last frame shows the whole path
+        if step <= 0:                                                   # fixed number of points per frame
+            total = len(path[1::skip])                                  # total number of frames
+            return (lambda k: k*skip), total
+        total = frames or int(np.ceil(s[-1]/step)) + 1                  # frames to travel the whole path
+        return (lambda k: np.searchsorted(s, k*step, side="right")), total
+
+    def _setup_matplotlib(self, ims:list, path:np.ndarray):
+        """ method to prepare the matplotlib figure for animation
+        args: (1) ims: list of images to show stacked
+              (2) path: array containing the trajectory to follow
+        rets: (1) draw: function that takes the travelled path and the
+                        camera position, and returns the rendered frame """
+
         lw = self._config["display"]["line_width"]                      # plot line width
         figure_size = self._config["display"]["figure_size"]            # output figure size
         color = self._config["display"]["line_color"]                   # plot line color
         ls = self._config["display"]["line_style"]                      # plot line style
-        smooth = self._config["display"]["camera_smooth"]               # smoothing coefficient for camera motion
+        fov = np.array(self._config["display"]["FoV"])                  # field of view size
 
         plt.clf()                                                       # clear current figure
         plt.get_current_fig_manager().window.wm_geometry(               # set figure geometry
@@ -120,38 +315,106 @@ class Animator:
         plt.subplots_adjust(left=0, right=1, bottom=0, top=1)           # adjust margins
         fig = plt.gcf()                                                 # current figure handle
 
-        frames = []                                                     # list of frames if output_mode is set to save
-        filename = ""                                                   # filename to save animation
-        [self._show(self._bitmaps[im]) for im in ims]                   # display map background        
+        [self._show(self._bitmap(im)) for im in ims]                    # display map background        
         line, = plt.plot(path[0], ls, linewidth=lw, color=color)        # draw first point
-        
-        total = len(path[1::skip])                                      # total number of iterations
-        for i, pos in tqdm(enumerate(path[1::skip]), total=total):      # iterate over path to follow
-            
-            line.set_data(path[:i*skip,0], path[:i*skip,1])             # update data
-            m = max(0,(i-smooth)*skip)                                  # start of averaging range
-            M = min(len(path), (i+smooth)*skip)                         # end of averaging range
-            cam_pos = [np.mean(path[m:M,0]), np.mean(path[m:M,1])]      # smooth camera position
-            self._set_FoV(np.array(cam_pos))                            # set current Field of View
-            fig.canvas.draw()                                           # update drawing             
-            plt.pause(0.001)                                            # time to allow visualization
-            
-            if output_mode == "save":                                   # update frame to output
-                frame = np.array(fig.canvas.renderer.buffer_rgba())     # get frame
-                frames.append(Image.fromarray(frame))                   # append it to frame list
-        
-        if output_mode == "save":                                       # output to file
-            filename = self._save(frames,                               # update file saving requirements
-                                    filename=filename)                  # save frame to specified filename
 
-    # private methods
+        def draw(trail:np.ndarray, cam_pos:np.ndarray) -> np.ndarray:
+            line.set_data(trail[:,0], trail[:,1])                       # update data
+            self._set_FoV(cam_pos, fov)                                 # set current Field of View
+            with self._profile.stage("draw"):                           # rasterize the figure
+                fig.canvas.draw()                                       # update drawing             
+            with self._profile.stage("pause"):                          # GUI event loop
+                plt.pause(0.001)                                        # time to allow visualization
+            with self._profile.stage("capture"):                        # copy the frame out
+                return np.array(fig.canvas.renderer.buffer_rgba())      # get frame
+        return draw
+
+    def _setup_opencv(self, ims:list):
+        """ method to prepare the headless OpenCV frame renderer
+        args: (1) ims: list of images to show stacked
+        rets: (1) draw: function that takes the travelled path and the
+                        camera position, and returns the rendered frame
+        note: the maps are opaque, so only the topmost one is visible """
+
+        display = self._config["display"]                               # display settings
+        renderer = FrameRenderer(self._background(ims[-1]), display)    # render over the topmost map
+        return renderer.render
     
-    def _set_FoV(self, current_pos:np.ndarray=np.array([0,0])) -> None:
+    def _asset(self, kind, filename:str, load=None):
+        """ method to get a loaded file from the shared assets
+        args: (1) kind: str type of file, passed to _load, or any hashable
+                        key when a load function is given
+              (2) filename: str containing the name of the file
+              (3) load: function to produce the asset, defaults to _load
+        rets: (1) asset: the loaded file
+        note: assets are keyed by file modification time, so an edited
+              file is loaded again; when several threads ask for the same
+              asset, one loads it and the others wait for the result """
+
+        key = (kind, filename, os.path.getmtime(filename))              # unchanged files share a key
+        with _assets_lock:                                              # one loader per key
+            future = self._assets.get(key)                              # loaded or being loaded
+            owner = future is None                                      # this thread loads it
+            if owner:
+                future = self._assets[key] = Future()                   # claim the key
+        if owner:
+            try:
+                future.set_result(self._load_asset(kind, filename, load))
+            except BaseException as error:                              # failed to load
+                with _assets_lock:
+                    del self._assets[key]                               # let a later call retry
+                future.set_exception(error)                             # wake up waiting threads
+        return future.result()
+
+    def _load_asset(self, kind, filename:str, load=None):
+        """ method to load an asset, timing file loads as the "load" stage """
+
+        if load:                                                        # derived asset, timed by its own stages
+            return load()
+        with self._profile.stage("load", file=filename):                # decode or read the file
+            return self._load(filename, m_type=kind)
+
+    def _bitmap(self, name:str) -> np.ndarray:
+        """ method to get a map bitmap, loading it on first use
+        args: (1) name: str containing the name of the map in the config
+        rets: (1) bitmap: RGB array of the map """
+
+        return self._asset("image", self._config["maps"][name])         # import from file once
+
+    def _background(self, name:str):
+        """ method to get the map to render frames over
+        args: (1) name: str containing the name of the map in the config
+        rets: (1) background: TiledMap if tiles are enabled in the config,
+                              otherwise the map's RGB array """
+
+        tiles = self._config.get("tiles", {})                           # tiled map settings
+        if not tiles.get("enabled", False):                             # tiles disabled
+            return self._bitmap(name)                                   # whole map in memory
+        path = self._config["maps"][name]                               # map file name
+        key = ("tiles", json.dumps(tiles, sort_keys=True))              # tiled map with these settings
+        return self._asset(key, path, lambda: self._load_asset("tiles", path))
+
+    def _palette(self, name:str) -> np.ndarray:
+        """ method to build the gif palette shared by every frame
+        args: (1) name: str containing the name of the map in the config
+        rets: (1) palette: uint8 array of [r, g, b] palette entries
+        note: the palette holds the map's main colors, plus the exact
+              trail color and the white shown outside the map """
+
+        background = self._background(name)                             # map shown in the frames
+        if isinstance(background, TiledMap):                            # tiled map
+            background = background.overview()                          # coarsest level is enough
+        line_color = [round(255*c) for c in self._config["display"]["line_color"]]
+        return build_palette(background, [line_color, [255, 255, 255]])
+
+    def _set_FoV(self, current_pos:np.ndarray=np.array([0,0]), fov:np.ndarray=None) -> None:
         """ method to dynamically set the current Field of View
         args: (1) current_pos: array containing the current position
+              (2) fov: array containing the FoV size (defaults to config)
         rets: none """
 
-        fov = np.array(self._config["display"]["FoV"])                  # get default FoV
+        if fov is None:                                                 # no FoV provided
+            fov = np.array(self._config["display"]["FoV"])              # get default FoV
         x_lim = current_pos[0] + fov[0]/2*np.array([-1, 1])             # plot xy limits
         y_lim = current_pos[1] + fov[1]/2*np.array([1, -1])             # plot xy limits
         plt.xlim(x_lim)                                                 # set x limits
@@ -180,9 +443,6 @@ class Animator:
 
         print(f"Apllying recursive positional filter {n}/{rec_limit}")  # notify user
 
-        dist = lambda pt, pts:np.sqrt(                                  # function to calculate distance
-            (pt[0] - pts[:,0])**2 + (pt[1] - pts[:,1])**2)              # euclidean distance between points
-        
         if start_dir.lower() == "north":                                # moving north
             start_point = np.argmax(xy[:,1])                            # bottommost point
         elif start_dir.lower() == "east":                               # moving east
@@ -194,14 +454,8 @@ class Animator:
         else:                                                           # incorrect setting
             start_point = np.argmin(xy[:,0])                            # leftmost point
         
-        xy_out = np.array([xy[start_point]])                            # output list of coordinates
-        pt = xy_out[-1]                                                 # reference point
-        rem = np.delete(xy, start_point, axis=0)                        # copy of remaining points
-        while len(rem) > 0:                                             # iterate over input list of coordinates
-            closest_idx = np.argmin(dist(pt, rem))                      # identify the closest neighbor
-            pt = rem[closest_idx]                                       # store it for next iteration
-            xy_out = np.concatenate((xy_out, [pt]), axis=0)             # append to list of output points
-            rem = np.delete(rem, closest_idx, axis=0)                   # remove it from the remaining points list
+        order = nearest_neighbour_order(xy, start_point)                # greedy closest-neighbor ordering
+        xy_out = xy[order]                                              # sorted list of coordinates
 
         d_filt = np.sqrt(np.diff(xy_out[:, 0]) ** 2 +                   # derivative mask
                          np.diff(xy_out[:, 1]) ** 2) < th               # filter against threshold
@@ -244,68 +498,136 @@ class Animator:
             color = self._config["display"]["line_color"]               # display line color
             plt.clf()                                                   # clear current figure
             map_name = list(self._config["maps"])[0]                    # get the name of the first map
-            plt.imshow(self._bitmaps[map_name])                         # show background map
+            plt.imshow(self._bitmap(map_name))                          # show background map
             plt.plot(matrix[:,0], matrix[:,1],linewidth=lw,color=color) # show plot
             plt.get_current_fig_manager().window.state('zoomed')        # maximize window
 
         plt.show(block=False)                                           # update visualization        
     
-    def _save(self, matrix, m_type:str="frames", filename:str='') -> str:
+    def _save(self, matrix, m_type:str="frames", filename:str='', background:str='') -> str:
         """ method to save the contents of an input matrix to file
-        args: (1) matrix; array containing data to save
+        args: (1) matrix; array containing data to save, or an iterable
+                          of frame arrays for "frames"
               (2) m_type: str describing the type of data
                   options: "image", "line", "frames"
               (3) filename: str containing name of file to save to
+              (4) background: str containing the name of the map shown in
+                              the frames, to build a shared gif palette
         rets: (1) filename: user-selected filename, in the case of an
                             empty input """
 
         if filename == '':
             default_extensions = {                                      # default file extensions
-                "image":("PNG Image", ".png"),                          # image
-                "line": ('Text File', ".dat"),                          # line datasets
-                "frames":('Animated GIF', '.gif')}                      # animated gifs
-            extension = default_extensions[m_type]                      # select the specified one
+                "image":[("PNG Image", ".png")],                        # image
+                "line": [('NumPy Array', ".npy"),                       # binary line datasets
+                         ('Text File', ".dat")],                        # text line datasets
+                "frames":[('Animated GIF', '.gif'),                     # animated gifs
+                          ('MP4 Video', '.mp4'),                        # mp4 videos
+                          ('WebM Video', '.webm')]}                     # webm videos
+            extensions = default_extensions[m_type]                     # select the specified ones
             
             root = tk.Tk()                                              # Create a Tkinter root window
             root.withdraw()                                             # Hide the main window
             filename = filedialog.asksaveasfilename(                    # Prompt the user to select a file location
-                filetypes=[extension])                                  # set default extension
+                filetypes=extensions)                                   # set default extension
 
         if filename == '':                                              # canceled by user
             return filename                                             # abort file saving
             
-        if m_type == "line":                                            # save matrix to dat file
-            np.savetxt(filename, matrix)                                # save to text
+        if m_type == "line":                                            # save matrix to data file
+            if filename.lower().endswith(".npy"):                       # binary path file
+                self._store(filename, matrix)                           # save compact array
+            else:                                                       # legacy text file
+                np.savetxt(filename, matrix)                            # save to text
             print(f"Generated path saved as '{filename}'")              # notify user
 
-        if m_type == "frames":                                          # save as animated gif
-            if filename [-4:] != ".gif":                                # incorrect or missing extension
+        if m_type == "frames":                                          # stream frames to an animation file
+            extension = filename[filename.rfind("."):].lower()          # requested file format
+            if extension not in [".gif", *VIDEO_CODECS]:                # incorrect or missing extension
                 filename += ".gif"                                      # add .gif to file name
             
             duration = self._config["output"]["frame_duration"]         # get frame duration config
             loop = self._config["output"]["loop"]                       # get number of loops config
 
-            print("Saving to file. This may take a while...")           # notify user
-
-            matrix[0].save(filename,                                    # save to file
-                           format='GIF',                                # file name
-                           mode="P",                                    # independent colormap
-                           append_images=matrix[1:],                    # append files
-                           save_all=True,                               # save all frames
-                           optimize=False,                              # maximize quality
-                           lossless=True,                               # maximize quality
-                           duration=duration,                           # frame duration
-                           loop=loop)                                   # number of loops
+            print(f"Rendering to '{filename}'...")                      # notify user
+
+            palette = None                                              # adaptive palette per frame
+            if self._config["output"].get("palette") == "global" and background:
+                with self._profile.stage("palette"):                    # quantize the map colors
+                    palette = self._palette(background)                 # palette shared by all frames
+            workers = self._config["output"].get("encode_workers", 1)   # quantization threads
+            writer = open_writer(filename, duration=duration, loop=loop,# incremental encoder
+                                 palette=palette, workers=workers)
+            try:
+                for frame in matrix:                                    # frames are rendered on demand
+                    with self._profile.stage("encode"):                 # time encoding apart
+                        writer.append_data(frame)                       # and encoded straight away
+            except BaseException:                                       # failed or interrupted
+                abort_writer(writer, filename)                          # delete the partial file
+                raise
+            with self._profile.stage("finish"):                         # pending frames and trailer
+                writer.close()                                          # finalize file
             
             print(f"Animation saved as '{filename}'")                   # notify user
 
         return filename
 
+    def _export_profile(self) -> None:
+        """ method to write the profiling report, if profiling is enabled
+        args: none
+        rets: none
+        note: the report covers everything since the Animator was created """
+
+        if self._profile.enabled:                                       # profiling enabled
+            self._profile.export(self._config["profile"].get("report", "profile.json"))
+
+    def _cache_file(self, name:str, *keys) -> str:
+        """ method to get the cache entry for some content
+        args: (1) name: str prefix of the cache entry
+              (2) keys: file names, whose contents are hashed, or dicts of
+                        settings, which are hashed as sorted json
+        rets: (1) filename: str containing the cache entry's file name, or
+                            an empty string if caching is disabled """
+
+        cache_dir = self._config.get("cache", "")                       # cache directory
+        if not cache_dir:                                               # caching disabled
+            return ""
+        digest = hashlib.sha256()                                       # content hash
+        for key in keys:                                                # iterate over keys
+            if isinstance(key, dict):                                   # settings
+                digest.update(json.dumps(key, sort_keys=True).encode()) # hash them in a stable order
+            else:                                                       # file
+                with open(key, "rb") as file:                           # open file in read
+                    for block in iter(lambda: file.read(1 << 20), b""): # read it in blocks
+                        digest.update(block)                            # hash its contents
+        os.makedirs(cache_dir, exist_ok=True)                           # make sure the cache exists
+        return os.path.join(cache_dir, f"{name}_{digest.hexdigest()[:24]}.npy")
+
+    def _store(self, filename:str, xy:np.ndarray) -> None:
+        """ method to store a path as a compact binary array
+        args: (1) filename: str containing the name of the .npy file, or an
+                            empty string to do nothing
+              (2) xy: array containing the path coordinates
+        rets: none
+        note: integer pixel paths are stored as int32, and the file is
+              written under a temporary name and then renamed, so that
+              concurrent readers never see a partial file """
+
+        if not filename:                                                # nothing to store
+            return
+        if np.array_equal(xy, np.round(xy)):                            # pixel coordinates
+            xy = np.asarray(xy, dtype=np.int32)                         # 8 bytes per point
+        fd, temp = tempfile.mkstemp(suffix=".tmp",                      # private temporary file
+                                    dir=os.path.dirname(filename) or ".")
+        with os.fdopen(fd, "wb") as file:                               # open file in write
+            np.save(file, xy)                                           # save binary array
+        os.replace(temp, filename)                                      # publish it atomically
+
     def _load(self, filename:str, m_type:str="image") -> np.ndarray:
         """ method to load the contents of a file into and ndarray
         args: (1) filename: str containing the name of the file to load
               (2) m_type: str type of the matrix to be loaded from file
-                          options: "image", "json", "path" 
+                          options: "image", "tiles", "json", "path" 
         rets: (1) matrix; array containing the imported data"""
 
         if m_type == "image":                                           # load bitmap image
@@ -313,9 +635,33 @@ class Animator:
             image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)              # convert to RGB
             return np.array(image)                                      # convert the image to a NumPy matrix
         
+        if m_type == "tiles":                                           # open tiled map pyramid
+            tiles = self._config.get("tiles", {})                       # tiled map settings
+            size = tiles.get("size", 512)                               # tile size
+            pyramid = tiles.get("pyramid", True)                        # build downsampled levels
+            prefix = self._cache_file("tiles", filename,                # tile files for this image
+                                      {"size": size, "pyramid": pyramid})[:-4]
+            folder = ""                                                 # temporary tile folder
+            if not prefix:                                              # caching disabled
+                folder = tempfile.mkdtemp()                             # tiles for this run only
+                prefix = os.path.join(folder, "tiles")
+            tiled = TiledMap(filename, prefix, tile=size,               # lazily read tiles
+                             lru=tiles.get("lru", 64), pyramid=pyramid)
+            if folder:                                                  # tiles for this run only
+                weakref.finalize(tiled, shutil.rmtree, folder,          # deleted with the map,
+                                 ignore_errors=True)                    # or at exit at the latest
+            return tiled
+        
         if m_type == "json":                                            # load config files
             with open(filename, 'r') as file:                           # open file in read
                 return json.load(file)                                  # load contents to dict
             
         if m_type == "path":                                            # load pre-generated path
-            return np.loadtxt(filename)                                 # load from text
+            if filename.lower().endswith(".npy"):                       # binary path file
+                return np.load(filename, mmap_mode="r")                 # memory-map it
+            cache = self._cache_file("dat", filename)                   # binary copy of the legacy file
+            if os.path.exists(cache):                                   # converted before
+                return np.load(cache, mmap_mode="r")                    # memory-map it
+            xy = np.loadtxt(filename)                                   # load from text
+            self._store(cache, xy)                                      # convert for the next run
+            return xy
@@ -0,0 +1,86 @@
+import json
+import copy
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from src.animator import Animator
+
+# config sections a job can override
+SECTIONS = ["maps", "tiles", "path", "filters", "output", "display", "profile"]
+
+def job_config(base:dict, *overrides) -> dict:
+    """ function to build the configuration of a batch job
+    args: (1) base: dict containing the base configuration
+          (2) overrides: dicts of config sections, applied in order
+    rets: (1) config: dict containing the job's configuration
+    note: jobs are always saved to file, without prompts, and rendered
+          headlessly, since matplotlib figures are not thread-safe """
+
+    config = copy.deepcopy(base)                                        # leave the base untouched
+    for override in overrides:                                          # defaults, then the job itself
+        for section in SECTIONS:                                        # sections to override
+            config.setdefault(section, {}).update(override.get(section, {}))
+    config["output"]["mode"] = "save"                                   # never preview
+    config["display"]["renderer"] = "opencv"                            # never open a figure
+    return config
+
+def run_batch(manifest, config="config.json", workers:int=None) -> list:
+    """ function to render several animations without any user interaction
+    args: (1) manifest: str containing the manifest file name, or manifest dict
+          (2) config: str containing the base config file name, or config dict
+          (3) workers: int number of jobs to render at the same time,
+                       defaults to the manifest's "workers" (or 1)
+    rets: (1) filenames: list of str containing the saved animation files
+    note: each job of the manifest's "jobs" list needs an output
+          "filename", and may override any of the maps, tiles, path,
+          filters, output, display and profile sections (on top of the
+          manifest's "defaults"), the stacked "layers" to show (default
+          ["map_back"]), and the "route" to extract from map_road instead
+          of loading path->path_road; maps and paths are loaded once
+          and shared by every job that uses them, and each job's
+          profiling report defaults to "<filename>.profile.json" """
+
+    if isinstance(manifest, str):                                       # manifest file
+        with open(manifest, 'r') as file:                               # open file in read
+            manifest = json.load(file)                                  # load contents to dict
+    if isinstance(config, str):                                         # base config file
+        with open(config, 'r') as file:                                 # open file in read
+            config = json.load(file)                                    # load contents to dict
+    if workers is None:                                                 # not set by the caller
+        workers = manifest.get("workers", 1)                            # number of concurrent jobs
+    defaults = manifest.get("defaults", {})                             # overrides shared by all jobs
+
+    settings = []                                                       # configuration of each job
+    for n, job in enumerate(manifest["jobs"]):                          # set up every job
+        if not job.get("filename"):                                     # would open a file dialog
+            raise ValueError(f"Batch job {n} has no output filename")
+        report = job.get("profile", {}).get("report",                   # one report per job
+                                            f"{job['filename']}.profile.json")
+        settings.append(job_config(config, defaults, job,               # job's configuration
+                                   {"output": {"filename": job["filename"]},
+                                    "profile": {"report": report}}))
+
+    tracing = not tracemalloc.is_tracing() and any(                     # memory traced by some job
+        s["profile"].get("enabled") and s["profile"].get("memory") for s in settings)
+    if tracing:                                                         # once for all jobs, so that
+        tracemalloc.start()                                             # no job stops the others' tracing
+    try:
+        assets = {}                                                     # maps and paths shared by all jobs
+        jobs = [(Animator(s, assets=assets),                            # animators sharing the assets
+                 job.get("layers", ["map_back"]), job.get("route"))     # list of (animator, layers, route)
+                for s, job in zip(settings, manifest["jobs"])]
+
+        unique = {}                                                     # one job per set of inputs
+        for animator, layers, route in jobs:                            # iterate over jobs
+            s = animator.get_config()                                   # job's configuration
+            key = json.dumps([layers, route] + [s.get(k) for k in       # everything the inputs depend on
+                              ["cache", "maps", "tiles", "path", "filters"]], sort_keys=True)
+            unique.setdefault(key, (animator, layers, route))
+
+        with ThreadPoolExecutor(max(1, workers)) as pool:               # decoding releases the GIL
+            list(pool.map(lambda job: job[0].load_assets(job[1], job[2]),# load each set of inputs once
+                          unique.values()))
+            return list(pool.map(lambda job: job[0].animate(            # render jobs concurrently
+                job[1], job[0].load_assets(job[1], job[2])), jobs))     # from the shared inputs
+    finally:
+        if tracing:                                                     # started here
+            tracemalloc.stop()                                          # stop tracing allocations
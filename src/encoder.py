@@ -0,0 +1,237 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import imageio
+from PIL import Image, GifImagePlugin
+
+VIDEO_CODECS = {".mp4": "libx264", ".webm": "libvpx-vp9"}              # ffmpeg codec for each video format
+TRANSPARENT = 255                                                       # global palette index left for transparency
+
+def build_palette(bitmap:np.ndarray, colors:list=(), samples:int=1<<20) -> np.ndarray:
+    """ function to build a gif palette shared by every frame of an animation
+    args: (1) bitmap: RGB array of the map the frames show
+          (2) colors: list of [r, g, b] colors to include exactly, such
+                      as the trail color
+          (3) samples: int number of map pixels to derive the palette from
+    rets: (1) palette: uint8 array of TRANSPARENT [r, g, b] entries """
+
+    step = max(1, int(np.sqrt(bitmap.shape[0]*bitmap.shape[1]/samples)))# subsample large maps
+    sample = np.ascontiguousarray(bitmap[::step, ::step, :3])           # evenly spread map pixels
+    n = TRANSPARENT - len(colors)                                       # entries left for the map
+    im = Image.fromarray(sample).quantize(colors=n)                     # median cut of the map colors
+    palette = np.array(im.getpalette()[:3*n], np.uint8).reshape(-1, 3)  # map colors
+    palette = np.vstack([palette, np.reshape(colors, (-1, 3))])         # append exact colors
+    return np.vstack([palette, np.zeros((TRANSPARENT - len(palette), 3))]).astype(np.uint8)
+
+class GifWriter:
+
+    # class constructor
+
+    def __init__(self, filename:str, duration:int=50, loop:int=0,
+                 palette:np.ndarray=None, workers:int=1) -> None:
+        """ a class that writes an animated gif one frame at a time, so that
+        only the previous frame is ever held in memory
+        args: (1) filename: str containing the name of the file to write
+              (2) duration: int duration of each frame, in ms
+              (3) loop: int number of loops (0 for infinite)
+              (4) palette: uint8 array of [r, g, b] entries shared by all
+                           frames, or None for an adaptive palette per frame
+              (5) workers: int number of threads quantizing frames ahead of
+                           the writer, with a shared palette
+        note: with a shared palette, each frame only stores the rectangle
+              that changed, and unchanged pixels inside it are transparent """
+
+        # private class members
+
+        self._file = open(filename, "wb")                               # output file handle
+        self._duration = duration                                       # frame duration
+        self._loop = loop                                               # number of loops
+        self._previous = None                                           # last written frame
+        self._palette = None                                            # shared palette image
+        if palette is not None:                                         # global palette
+            self._palette = Image.new("P", (1, 1))                      # palette carrier
+            self._palette.putpalette(palette[:TRANSPARENT].ravel().tolist())
+        self._executor = None                                           # quantization threads
+        if self._palette is not None and workers > 1:                   # parallel quantization
+            self._executor = ThreadPoolExecutor(workers)                # pillow releases the GIL
+        self._workers = workers                                         # number of threads
+        self._pending = deque()                                         # frames being quantized, in order
+
+    # public methods
+
+    def append_data(self, frame:np.ndarray) -> None:
+        """ method to encode a frame and write it to file
+        args: (1) frame: RGB or RGBA array containing the frame
+        rets: none """
+
+        frame = np.ascontiguousarray(frame[:, :, :3])                   # drop any alpha channel
+        if self._palette is None:                                       # adaptive palettes
+            self._write_adaptive(frame)                                 # quantize changed area
+        elif self._executor is None:                                    # shared palette, serial
+            self._write_indexed(self._to_indices(frame))                # quantize and write
+        else:                                                           # shared palette, parallel
+            self._pending.append(self._executor.submit(self._to_indices, frame))
+            if len(self._pending) > 2*self._workers:                    # enough frames in flight
+                self._write_indexed(self._pending.popleft().result())   # write the oldest one
+
+    def close(self) -> None:
+        """ method to terminate the gif stream and close the file
+        args: none
+        rets: none
+        note: a gif needs at least one frame, so if none was appended the
+              file is deleted and a ValueError is raised """
+
+        while self._pending:                                            # frames still being quantized
+            self._write_indexed(self._pending.popleft().result())       # write them in order
+        if self._executor is not None:                                  # quantization threads
+            self._executor.shutdown()                                   # stop them
+        if self._previous is None:                                      # no frames written
+            self._file.close()                                          # release file handle
+            os.remove(self._file.name)                                  # no empty gif left behind
+            raise ValueError(f"No frames were written to '{self._file.name}'")
+        self._file.write(b";")                                          # gif trailer
+        self._file.close()                                              # release file handle
+
+    def abort(self) -> None:
+        """ method to stop writing and delete the unfinished gif
+        args: none
+        rets: none
+        note: never raises, so that it can run while another error is
+              being handled """
+
+        for future in self._pending:                                    # frames still being quantized
+            future.cancel()                                             # no longer needed
+        self._pending.clear()
+        if self._executor is not None:                                  # quantization threads
+            self._executor.shutdown()                                   # stop them
+        self._file.close()                                              # release file handle
+        if os.path.exists(self._file.name):                             # partial gif
+            os.remove(self._file.name)                                  # no broken file left behind
+
+    # private methods
+
+    def _write_adaptive(self, frame:np.ndarray) -> None:
+        """ method to write a frame with its own palette
+        args: (1) frame: RGB array containing the frame
+        rets: none """
+
+        if self._previous is None:                                      # first frame
+            im = self._quantize(frame)                                  # palette image
+            self._write_header(im)                                      # with this frame's palette
+            self._write(GifImagePlugin.getdata(                         # write full frame
+                im, (0, 0), duration=self._duration))
+        else:                                                           # following frames
+            x0, y0, x1, y1 = self._changed(frame, self._previous)       # changed area
+            im = self._quantize(frame[y0:y1, x0:x1])                    # palette of changed area
+            self._write(GifImagePlugin.getdata(                         # write changed area only
+                im, (x0, y0), duration=self._duration,                  # at its offset
+                include_color_table=True))                              # with its own palette
+        self._previous = frame                                          # reference for the next delta
+
+    def _write_indexed(self, indices:np.ndarray) -> None:
+        """ method to write a frame quantized to the shared palette
+        args: (1) indices: uint8 array of palette indices
+        rets: none """
+
+        if self._previous is None:                                      # first frame
+            im = self._image(indices)                                   # full frame
+            self._write_header(im)                                      # with the shared palette
+            self._write(GifImagePlugin.getdata(                         # write full frame
+                im, (0, 0), duration=self._duration))
+        else:                                                           # following frames
+            x0, y0, x1, y1 = self._changed(indices, self._previous)     # changed area
+            region = indices[y0:y1, x0:x1].copy()                       # changed rectangle
+            same = region == self._previous[y0:y1, x0:x1]               # pixels already shown
+            region[same] = TRANSPARENT                                  # let the previous frame through
+            self._write(GifImagePlugin.getdata(                         # write changed area only
+                self._image(region), (x0, y0),                          # at its offset
+                duration=self._duration, transparency=TRANSPARENT,      # with transparent holes
+                disposal=1))                                            # drawn over the previous frame
+        self._previous = indices                                        # reference for the next delta
+
+    def _write_header(self, im:Image.Image) -> None:
+        """ method to write the gif header with an image's palette """
+
+        header, _ = GifImagePlugin.getheader(im, info={"loop": self._loop})
+        self._write(header)
+
+    def _changed(self, frame:np.ndarray, previous:np.ndarray) -> tuple:
+        """ method to find the bounding rectangle of the changed pixels
+        args: (1) frame: array containing the current frame
+              (2) previous: array containing the previous frame
+        rets: (1) x0, y0, x1, y1: int bounds, one pixel wide if unchanged """
+
+        changed = frame != previous                                     # changed values
+        if changed.ndim == 3:                                           # RGB frames
+            changed = changed.any(axis=2)                               # changed pixels
+        rows, cols = changed.any(axis=1), changed.any(axis=0)           # changed rows and columns
+        if not rows.any():                                              # identical frame
+            return 0, 0, 1, 1                                           # smallest possible update
+        y0, y1 = np.flatnonzero(rows)[[0, -1]]                          # vertical extent
+        x0, x1 = np.flatnonzero(cols)[[0, -1]]                          # horizontal extent
+        return int(x0), int(y0), int(x1) + 1, int(y1) + 1
+
+    def _to_indices(self, frame:np.ndarray) -> np.ndarray:
+        """ method to map an RGB array to the shared palette """
+
+        im = Image.fromarray(frame).quantize(palette=self._palette,     # nearest palette entry
+                                             dither=Image.Dither.NONE)  # stable between frames
+        return np.asarray(im)
+
+    def _image(self, indices:np.ndarray) -> Image.Image:
+        """ method to wrap palette indices in an image with the shared palette """
+
+        im = Image.fromarray(indices, mode="P")                         # palette image
+        im.putpalette(self._palette.getpalette() + [0, 0, 0])           # plus the transparent entry
+        return im
+
+    def _quantize(self, frame:np.ndarray) -> Image.Image:
+        """ method to convert an RGB array into a palette image """
+
+        return Image.fromarray(frame).convert("P", palette=Image.Palette.ADAPTIVE)
+
+    def _write(self, chunks:list) -> None:
+        """ method to write a list of encoded byte chunks to file """
+
+        for chunk in chunks:                                            # iterate over chunks
+            self._file.write(chunk)                                     # write each one
+
+def open_writer(filename:str, duration:int=50, loop:int=0, palette:np.ndarray=None,
+                workers:int=1):
+    """ function to open an incremental frame writer for an output file
+    args: (1) filename: str containing the name of the file to write
+          (2) duration: int duration of each frame, in ms
+          (3) loop: int number of loops (0 for infinite), gif only
+          (4) palette: uint8 array of shared palette entries, gif only
+          (5) workers: int number of quantization threads, gif only
+    rets: (1) writer: object with append_data(frame) and close() methods
+    note: mp4 and webm files are encoded by ffmpeg through imageio, which
+          requires the imageio-ffmpeg module """
+
+    extension = os.path.splitext(filename)[1].lower()                   # output format
+    if extension in VIDEO_CODECS:                                       # video output
+        return imageio.get_writer(filename, format="FFMPEG", mode="I",  # stream frames to ffmpeg
+                                  fps=1000/duration,                    # frame rate from duration
+                                  codec=VIDEO_CODECS[extension],        # codec for this container
+                                  macro_block_size=2)                   # keep yuv420p dimensions even
+    return GifWriter(filename, duration=duration, loop=loop,
+                     palette=palette, workers=workers)
+
+def abort_writer(writer, filename:str) -> None:
+    """ function to close a frame writer after a failure and delete its file
+    args: (1) writer: object returned by open_writer
+          (2) filename: str containing the name of the file being written
+    rets: none
+    note: errors raised while closing are suppressed, so that the failure
+          that interrupted the writer is the one reported """
+
+    if isinstance(writer, GifWriter):                                   # gif written here
+        writer.abort()                                                  # discard pending frames
+        return
+    try:
+        writer.close()                                                  # stop ffmpeg
+    except Exception:                                                   # nothing worth keeping
+        pass
+    if os.path.exists(filename):                                        # partial video
+        os.remove(filename)                                             # no broken file left behind
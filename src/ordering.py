@@ -0,0 +1,115 @@
+import numpy as np
+
+class GridIndex:
+
+    # class constructor
+
+    def __init__(self, xy:np.ndarray, cell:int=4, ratio:int=8, rings:int=2) -> None:
+        """ a spatial index of points bucketed into a hierarchy of uniform
+        grids, which supports nearest-neighbour queries and removal of
+        visited points
+        args: (1) xy: array containing the list of coordinates to index
+              (2) cell: int size of the finest grid cells, in pixels
+              (3) ratio: int size ratio between consecutive grid levels
+              (4) rings: int rings to search on a level before moving up """
+
+        # private class members
+
+        self._xs = xy[:,0].tolist()                                     # x coordinates as python floats
+        self._ys = xy[:,1].tolist()                                     # y coordinates as python floats
+        self._alive = set(range(len(xy)))                               # indices of points not yet removed
+        self._rings = rings                                             # rings per level
+        span = float(np.ptp(xy, axis=0).max()) if len(xy) else 0        # extent of the point cloud
+        self._cells = [cell]                                            # cell size of each level
+        while self._cells[-1] <= span:                                  # until one cell covers everything
+            self._cells.append(self._cells[-1]*ratio)                   # add a coarser level
+        self._extent = [int(span//c) + 1 for c in self._cells]          # grid span of each level, in cells
+        self._levels = []                                               # list of dicts of cell -> indices
+        for c in self._cells:                                           # bucket points on every level
+            buckets = {}                                                # dict of cell -> set of indices
+            keys = np.floor(xy/c).astype(np.int64).tolist()             # cell of each point
+            for idx, key in enumerate(map(tuple, keys)):                # iterate over points
+                buckets.setdefault(key, set()).add(idx)                 # add to its cell
+            self._levels.append(buckets)
+
+    # public methods
+
+    def __len__(self) -> int:
+        return len(self._alive)
+
+    def remove(self, idx:int) -> None:
+        """ method to remove a point from the index
+        args: (1) idx: int index of the point to remove
+        rets: none """
+
+        x, y = self._xs[idx], self._ys[idx]                             # point coordinates
+        for c, buckets in zip(self._cells, self._levels):               # iterate over levels
+            key = (int(x//c), int(y//c))                                # cell containing the point
+            bucket = buckets[key]                                       # points in that cell
+            bucket.discard(idx)                                         # drop the point
+            if not bucket:                                              # cell became empty
+                del buckets[key]                                        # stop visiting it
+        self._alive.discard(idx)                                        # no longer a candidate
+
+    def nearest(self, x:float, y:float) -> int:
+        """ method to find the nearest remaining point to a position
+        args: (1) x: float x coordinate of the query position
+              (2) y: float y coordinate of the query position
+        rets: (1) idx: int index of the closest point, -1 if none is left
+        note: ties are broken by the lowest index, matching np.argmin """
+
+        best = (float("inf"), -1)                                       # (squared distance, index)
+        if len(self._alive) <= 2*self._rings + 1:                       # hardly any points left
+            return min(self._candidates(x, y, self._alive), default=best)[1]
+        last = len(self._levels) - 1                                    # coarsest level
+        for level, (c, buckets) in enumerate(zip(self._cells, self._levels)):
+            cx, cy = int(x//c), int(y//c)                               # cell containing the query
+            r_max = self._extent[level] if level == last else self._rings
+            for r in range(r_max + 1):                                  # search rings outwards
+                for key in self._ring(cx, cy, r):                       # cells at Chebyshev distance r
+                    if key in buckets:                                  # non-empty cell
+                        best = min(best, min(self._candidates(          # closest point
+                            x, y, buckets[key])))                       # in this cell
+                # points in farther rings are at least r cells away
+                if best[0] < (r*c)**2:                                  # nothing closer can remain
+                    return best[1]
+        return best[1]
+
+    # private methods
+
+    def _candidates(self, x:float, y:float, idxs) -> list:
+        """ method to list the squared distance to each of a set of points """
+
+        xs, ys = self._xs, self._ys                                     # local aliases for speed
+        return [((xs[i] - x)**2 + (ys[i] - y)**2, i) for i in idxs]
+
+    def _ring(self, cx:int, cy:int, r:int):
+        """ method to iterate over the cells at Chebyshev distance r """
+
+        if r == 0:                                                      # the query cell itself
+            yield (cx, cy)
+            return
+        for dx in range(-r, r+1):                                       # top and bottom rows
+            yield (cx + dx, cy - r)
+            yield (cx + dx, cy + r)
+        for dy in range(-r+1, r):                                       # left and right columns
+            yield (cx - r, cy + dy)
+            yield (cx + r, cy + dy)
+
+def nearest_neighbour_order(xy:np.ndarray, start:int=0) -> np.ndarray:
+    """ function to sort a list of coordinates by repeatedly hopping to the
+    closest point not yet visited
+    args: (1) xy: array containing the list of coordinates to sort
+          (2) start: int index of the point to start from
+    rets: (1) order: int array of indices into xy, in visiting order """
+
+    index = GridIndex(xy)                                               # spatial index of all points
+    pts = xy.tolist()                                                   # coordinates as python floats
+    order = np.empty(len(xy), dtype=np.int64)                           # visiting order
+    idx = start                                                         # current point
+    for n in range(len(xy)):                                            # visit every point once
+        order[n] = idx                                                  # record it
+        index.remove(idx)                                               # mark it as visited
+        if len(index):                                                  # points left to visit
+            idx = index.nearest(*pts[idx])                              # hop to the closest one
+    return order
@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+try:
+    import resource                                                     # peak memory, unix only
+except ImportError:
+    resource = None
+
+_OFF = nullcontext()                                                    # shared no-op stage
+
+def peak_rss_mb() -> float:
+    """ function to measure the peak resident memory of this process
+    args: none
+    rets: (1) rss: float peak resident memory in MB, or None where the
+                   resource module is not available (windows) """
+
+    if resource is None:                                                # not a unix platform
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss            # kilobytes on linux
+    rss = rss/2**20 if sys.platform == "darwin" else rss/2**10          # bytes on macos
+    return round(rss, 1)
+
+class Profiler:
+
+    # class constructor
+
+    def __init__(self, enabled:bool=False, memory:bool=False) -> None:
+        """ a class that records how long each stage of the pipeline takes,
+        as a list of trace events and per-stage totals
+        args: (1) enabled: bool to record anything at all; when disabled,
+                           stages cost a single method call
+              (2) memory: bool to also trace the peak Python and numpy
+                          memory of each stage, with tracemalloc, which
+                          slows everything down noticeably
+        note: memory peaks are process-wide, so they overlap when several
+              threads are profiled at the same time """
+
+        # private class members
+
+        self._enabled = enabled                                         # record stages
+        self._memory = enabled and memory                               # trace memory peaks
+        self._start = time.perf_counter()                               # trace time origin
+        self._events = []                                               # trace events, in completion order
+        self._stats = {}                                                # stage -> [calls, total s, max s, blocks, peak bytes]
+        self._local = threading.local()                                 # per-thread stack of open stages
+        self._tracing = self._memory and not tracemalloc.is_tracing()   # tracing started here
+        if self._tracing:                                               # not traced yet
+            tracemalloc.start()                                         # trace allocations from now on
+
+    # public methods
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def stage(self, name:str, **args):
+        """ method to time a stage of the pipeline
+        args: (1) name: str name of the stage
+              (2) args: values to attach to the stage's trace event
+        rets: (1) context: context manager wrapping the stage """
+
+        if not self._enabled:                                           # profiling disabled
+            return _OFF
+        return self._record(name, args)
+
+    def iterate(self, name:str, iterable):
+        """ method to time how long each item of an iterable takes to produce
+        args: (1) name: str name of the stage
+              (2) iterable: iterable to time, such as lazily rendered frames
+        rets: (1) iterable: the same items, each timed as a stage """
+
+        if not self._enabled:                                           # profiling disabled
+            return iterable
+        return self._iterate(name, iterable)
+
+    def live(self, bar):
+        """ generator to show the stage summary next to a tqdm progress bar
+        args: (1) bar: tqdm progress bar to iterate over
+        rets: (1) item: each item of the bar """
+
+        for item in bar:                                                # iterate over the bar
+            bar.set_postfix_str(self.summary(max(2, bar.n - 1)),        # stages repeated every frame
+                                refresh=False)                          # shown at the next refresh
+            yield item
+
+    def summary(self, min_calls:int=2) -> str:
+        """ method to summarize the mean duration of the repeated stages
+        args: (1) min_calls: int number of calls of the stages to include
+        rets: (1) summary: str containing the mean time of each stage """
+
+        return ", ".join(f"{name} {1e3*total/calls:.1f}ms"              # mean duration
+                         for name, (calls, total, *_) in list(self._stats.items())
+                         if calls >= min_calls)                         # repeated stages only
+
+    def report(self) -> dict:
+        """ method to build the profiling report
+        args: none
+        rets: (1) report: dict in the Chrome trace event format, which
+                          chrome://tracing and Perfetto open directly, with
+                          the per-stage totals under "stages" """
+
+        stages = {}                                                     # per-stage totals
+        for name, (calls, total, longest, blocks, peak) in list(self._stats.items()):
+            stages[name] = {"calls": calls, "total_s": round(total, 6), # time spent
+                            "mean_ms": round(1e3*total/calls, 3),
+                            "max_ms": round(1e3*longest, 3),
+                            "blocks": blocks}                           # net allocated memory blocks
+            if self._memory:                                            # traced memory
+                stages[name]["peak_mb"] = round(peak/2**20, 3)          # largest stage peak
+        return {"traceEvents": list(self._events), "displayTimeUnit": "ms",
+                "stages": stages, "peak_rss_mb": peak_rss_mb()}
+
+    def export(self, filename:str) -> None:
+        """ method to write the profiling report to a json file
+        args: (1) filename: str containing the name of the report file, or
+                            an empty string to do nothing
+        rets: none
+        note: memory tracing started by this profiler is stopped, so that
+              it does not slow down whatever runs next """
+
+        if not self._enabled:                                           # nothing to export
+            return
+        if filename:                                                    # report requested
+            with open(filename, 'w') as file:                           # open file in write
+                json.dump(self.report(), file)                          # save report
+            print(f"Profiling report saved as '{filename}'")            # notify user
+        if self._tracing:                                               # started by this profiler
+            tracemalloc.stop()                                          # stop tracing allocations
+            self._tracing = False
+            self._memory = False                                        # no more memory peaks
+
+    # private methods
+
+    @contextmanager
+    def _record(self, name:str, args:dict):
+        """ context manager to record a stage as a trace event """
+
+        stack = self._local.__dict__.setdefault("stack", [])            # this thread's open stages
+        if self._memory:                                                # traced memory
+            current, peak = tracemalloc.get_traced_memory()             # usage when the stage starts
+            if stack:                                                   # nested stage
+                stack[-1][1] = max(stack[-1][1], peak)                  # keep the parent's peak so far
+            tracemalloc.reset_peak()                                    # measure this stage's peak
+            stack.append([current, current])                            # usage at start, peak so far
+        blocks = sys.getallocatedblocks()                               # allocated blocks at start
+        start = time.perf_counter()
+        try:
+            yield args                                                  # "discard" set to skip the event
+        finally:
+            duration = time.perf_counter() - start
+            blocks = sys.getallocatedblocks() - blocks                  # blocks left allocated
+            peak = 0                                                    # stage memory peak
+            if self._memory:                                            # traced memory
+                current, top = stack.pop()                              # usage at start, children's peak
+                top = max(top, tracemalloc.get_traced_memory()[1])      # highest usage during the stage
+                if stack:                                               # nested stage
+                    stack[-1][1] = max(stack[-1][1], top)               # counts towards the parent
+                peak = top - current                                    # growth above the start
+            if not args.pop("discard", False):                          # worth recording
+                self._add(name, args, start, duration, blocks, peak)
+
+    def _add(self, name:str, args:dict, start:float, duration:float, blocks:int, peak:int) -> None:
+        """ method to add a finished stage to the trace and the stage totals """
+
+        self._events.append({"name": name, "ph": "X",                   # complete trace event
+                             "ts": 1e6*(start - self._start),           # start, in microseconds
+                             "dur": 1e6*duration,                       # duration, in microseconds
+                             "pid": os.getpid(), "tid": threading.get_ident(), "args": args})
+        stats = self._stats.setdefault(name, [0, 0.0, 0.0, 0, 0])       # stage totals
+        stats[0] += 1                                                   # calls
+        stats[1] += duration                                            # total time
+        stats[2] = max(stats[2], duration)                              # longest call
+        stats[3] += blocks                                              # net allocated blocks
+        stats[4] = max(stats[4], peak)                                  # largest peak
+
+    def _iterate(self, name:str, iterable):
+        """ generator to time each item of an iterable as a stage """
+
+        iterator = iter(iterable)
+        frame = 0                                                       # item number
+        while True:
+            with self._record(name, {"frame": frame}) as args:          # time producing the item
+                item = next(iterator, StopIteration)                    # sentinel when exhausted
+                args["discard"] = item is StopIteration                 # not an item
+            if item is StopIteration:                                   # exhausted
+                return
+            yield item
+            frame += 1
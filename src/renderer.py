@@ -0,0 +1,197 @@
+import os
+import tempfile
+from collections import deque
+import multiprocessing
+import cv2
+import numpy as np
+from src.tiles import TiledMap, TileLayer, crop_array
+
+POINTS_TO_PIXELS = 100/72                                               # matplotlib default dpi over points per inch
+
+class FrameRenderer:
+
+    # class constructor
+
+    def __init__(self, background, display:dict) -> None:
+        """ a class that renders animation frames without a GUI backend, by
+        cropping the Field of View straight out of a map bitmap and
+        compositing a persistent trail layer rasterized with OpenCV
+        args: (1) background: RGB array or TiledMap to render over
+              (2) display: dict containing the "display" configuration,
+                           with a solid ("-") line_style
+        note: with a TiledMap, only the tiles under the FoV are read, from
+              the coarsest pyramid level that keeps full detail """
+
+        if display.get("line_style", "-") != "-":                       # only solid trails are drawn
+            raise ValueError(f"The opencv renderer only draws solid lines, "
+                             f"not line_style '{display['line_style']}'")
+
+        # private class members
+
+        self._background = background                                   # map to crop from
+        self._size = tuple(display["figure_size"])                      # output frame width and height
+        fov = np.array(display["FoV"], dtype=float)                     # field of view width and height
+        scale = min(self._size[0]/fov[0], self._size[1]/fov[1])         # output pixels per map pixel
+        self._level = (background.level_for(scale)                      # pyramid level to read
+                       if isinstance(background, TiledMap) else 0)      # full resolution for arrays
+        self._factor = 2.0**-self._level                                # level pixels per map pixel
+        self._scale = scale/self._factor                                # output pixels per level pixel
+        lw = display["line_width"]*POINTS_TO_PIXELS/self._scale         # line width in level pixels
+        self._lw = max(1, round(lw))                                    # as drawn on the trail layer
+        self._color = np.array(                                         # line color as 8-bit RGB
+            [round(255*c) for c in display["line_color"]], np.uint16)   # from matplotlib's [0,1] range
+        self._layer = TileLayer()                                       # trail coverage over the whole map
+        self._drawn = 0                                                 # path points already on the layer
+
+    # public methods
+
+    def render(self, path:np.ndarray, cam_pos:np.ndarray) -> np.ndarray:
+        """ method to render a single frame
+        args: (1) path: array containing the travelled path coordinates
+              (2) cam_pos: array containing the camera (FoV centre) position
+        rets: (1) frame: RGB array of size figure_size
+        note: consecutive calls should pass growing prefixes of the same
+              path, so that only the newly travelled segment is drawn """
+
+        x0, y0, w, h, M = self._window(self._to_level(cam_pos))         # FoV window and its transform
+        if isinstance(self._background, TiledMap):                      # tiled map
+            window = self._background.crop(self._level, x0, y0, w, h)   # read only the overlapping tiles
+        else:                                                           # in-memory map
+            window = crop_array(self._background, x0, y0, w, h)         # slice the FoV window
+        frame = cv2.warpAffine(window, M, self._size,                   # scale the FoV window
+                               flags=cv2.INTER_LINEAR,                  # bilinear like imshow's resampling
+                               borderMode=cv2.BORDER_CONSTANT,          # pad outside the map
+                               borderValue=(255, 255, 255))             # with the figure's white face
+        self._extend_trail(path)                                        # add the new segment to the layer
+        if self._drawn > 1:                                             # there is a trail to show
+            alpha = cv2.warpAffine(self._layer.crop(x0, y0, w, h), M,   # crop the layer like the map
+                                   self._size, flags=cv2.INTER_LINEAR)  # outside the map is uncovered
+            self._composite(frame, alpha)                               # paint the trail over the map
+        return frame
+
+    # private methods
+
+    def _to_level(self, xy:np.ndarray) -> np.ndarray:
+        """ method to convert map pixel coordinates to pyramid level ones
+        args: (1) xy: array containing map pixel coordinates
+        rets: (1) xy: array containing level pixel coordinates """
+
+        return (np.asarray(xy, dtype=float) + 0.5)*self._factor - 0.5   # level pixels span 2**level map pixels
+
+    def _window(self, cam:np.ndarray) -> tuple:
+        """ method to find the level window under the FoV and its transform
+        args: (1) cam: array containing the camera position in level pixels
+        rets: (1-4) x0, y0, w, h: int window bounds, with a 2 pixel margin
+              (5) M: 2x3 float array mapping window pixels to frame pixels """
+
+        s = self._scale                                                 # uniform scale, as imshow keeps aspect
+        half = np.array(self._size)/(2*s)                               # half FoV, in level pixels
+        x0, y0 = np.floor(cam - half).astype(int) - 2                   # window top-left
+        x1, y1 = np.ceil(cam + half).astype(int) + 2                    # window bottom-right
+        tx = self._size[0]/2 - 0.5 - s*(cam[0] - x0)                    # centre the camera horizontally
+        ty = self._size[1]/2 - 0.5 - s*(cam[1] - y0)                    # centre the camera vertically
+        return x0, y0, x1 - x0, y1 - y0, np.array([[s, 0, tx], [0, s, ty]])
+
+    def _extend_trail(self, path:np.ndarray) -> None:
+        """ method to draw the not yet drawn part of a path on the trail layer
+        args: (1) path: array containing the travelled path coordinates
+        rets: none """
+
+        if len(path) < self._drawn:                                     # rewound path
+            self._layer = TileLayer()                                   # start from an empty layer
+            self._drawn = 0                                             # nothing drawn yet
+        start = max(0, self._drawn - 1)                                 # join with the previous segment
+        if len(path) - start < 2:                                       # no new segment
+            return
+        pts = self._to_level(path[start:])                              # new segment in level pixels
+        self._layer.polyline(pts, self._lw)                             # draw it
+        self._drawn = len(path)                                         # remember progress
+
+    def _composite(self, frame:np.ndarray, alpha:np.ndarray) -> None:
+        """ method to blend the trail color over a frame
+        args: (1) frame: RGB array to draw on
+              (2) alpha: uint8 array containing the trail coverage
+        rets: none
+        note: the input frame is modified directly """
+
+        x, y, w, h = cv2.boundingRect(alpha)                            # covered region of the frame
+        if w == 0:                                                      # trail is out of view
+            return
+        a = alpha[y:y+h, x:x+w, None].astype(np.uint16)                 # coverage of the region
+        region = frame[y:y+h, x:x+w]                                    # frame pixels of the region
+        region[:] = (region*(255 - a) + self._color*a + 127)//255       # alpha blend in integers
+
+_worker = {}                                                            # per-process renderer state
+
+def _init_worker(background, display:dict, path:np.ndarray) -> None:
+    """ function to set up the renderer of a worker process
+    args: (1) background: str containing the memory-mapped map file, or
+                          TiledMap to render over
+          (2) display: dict containing the "display" configuration
+          (3) path: array containing the trajectory to follow
+    rets: none """
+
+    if isinstance(background, str):                                     # in-memory map saved to file
+        background = np.load(background, mmap_mode="r")                 # map pages are shared, not copied
+    _worker["renderer"] = FrameRenderer(background, display)            # worker's own renderer
+    _worker["path"] = path                                              # worker's copy of the path
+
+def _render_chunk(ends:np.ndarray, cams:np.ndarray) -> list:
+    """ function to render a contiguous range of frames in a worker process
+    args: (1) ends: int array containing the trail length of each frame
+          (2) cams: array containing the camera position of each frame
+    rets: (1) frames: list of RGB arrays, in order """
+
+    renderer, path = _worker["renderer"], _worker["path"]               # set up by _init_worker
+    return [renderer.render(path[:n], cam) for n, cam in zip(ends, cams)]
+
+def available_cpus() -> int:
+    """ function to count the cores this process is allowed to run on
+    args: none
+    rets: (1) cpus: int number of usable cores, which is lower than the
+                    machine's core count under taskset or a container
+                    cpu set """
+
+    if hasattr(os, "sched_getaffinity"):                                # linux
+        return len(os.sched_getaffinity(0))                             # cores in this process's cpu set
+    return os.cpu_count() or 1                                          # every core elsewhere
+
+def render_parallel(background, display:dict, path:np.ndarray,
+                    ends:np.ndarray, cams:np.ndarray, workers:int=0, chunk:int=8):
+    """ generator to render frames on a pool of worker processes
+    args: (1) background: RGB array or TiledMap to render over
+          (2) display: dict containing the "display" configuration
+          (3) path: array containing the trajectory to follow
+          (4) ends: int array containing the trail length of each frame
+          (5) cams: array containing the camera position of each frame
+          (6) workers: int number of processes (0 for one per usable core)
+          (7) chunk: int number of consecutive frames per task
+    rets: (1) frame: RGB array of each rendered frame, in order
+    note: the map is shared with the workers through memory-mapped
+          files, and only a few chunks are in flight at any time, so
+          memory use does not grow with the number of frames """
+
+    workers = workers or available_cpus()                               # default to one per usable core
+    bitmap_file = ""                                                    # file backing an in-memory map
+    if not isinstance(background, TiledMap):                            # tiled maps are files already
+        fd, bitmap_file = tempfile.mkstemp(suffix=".npy")               # file backing the shared map
+        os.close(fd)                                                    # np.save reopens it
+    try:
+        if bitmap_file:                                                 # in-memory map
+            np.save(bitmap_file, np.ascontiguousarray(background))      # write map once for all workers
+        methods = multiprocessing.get_all_start_methods()               # supported on this platform
+        ctx = multiprocessing.get_context(                              # fresh workers, not forked from
+            "forkserver" if "forkserver" in methods else "spawn")       # a process holding threads
+        with ctx.Pool(workers, _init_worker,                            # start worker pool
+                      (bitmap_file or background, display, path)) as pool:
+            pending = deque()                                           # ordered in-flight chunks
+            for start in range(0, len(ends), chunk):                    # split frame range
+                pending.append(pool.apply_async(_render_chunk,          # submit chunk
+                    (ends[start:start+chunk], cams[start:start+chunk])))
+                if len(pending) >= 2*workers:                           # enough work queued
+                    yield from pending.popleft().get()                  # collect the oldest chunk
+            while pending:                                              # drain remaining chunks
+                yield from pending.popleft().get()                      # in submission order
+    finally:
+        if bitmap_file:                                                 # in-memory map
+            os.remove(bitmap_file)                                      # release shared map file
@@ -0,0 +1,345 @@
+import heapq
+from collections import deque
+import cv2
+import numpy as np
+from src.ordering import GridIndex
+
+def color_masks(image:np.ndarray, colors:dict) -> dict:
+    """ function to find the pixels of several colors in a single pass
+    args: (1) image: RGB array to search
+          (2) colors: dict of name -> [r, g, b] color to look for
+    rets: (1) masks: dict of name -> bool array of the matching pixels """
+
+    packed = (image[..., 0].astype(np.int32) << 16 |                    # one integer per pixel
+              image[..., 1].astype(np.int32) << 8 | image[..., 2])
+    keys = {}                                                           # packed value of each color
+    for name, c in colors.items():                                      # iterate over colors
+        r, g, b = (float(v) for v in c)                                 # colors may be given as floats
+        if r.is_integer() and g.is_integer() and b.is_integer():        # a possible 8-bit pixel value
+            keys[name] = int(r) << 16 | int(g) << 8 | int(b)
+        else:                                                           # no pixel can match it
+            keys[name] = -1
+    hits = np.flatnonzero(np.isin(packed, list(keys.values())))         # pixels of any route color
+    values = packed.ravel()[hits]                                       # color of each hit
+    masks = {}                                                          # dict of route masks
+    for name, key in keys.items():                                      # split hits by color
+        mask = np.zeros(image.shape[:2], bool)                          # empty mask
+        mask.ravel()[hits[values == key]] = True                        # pixels of this color
+        masks[name] = mask
+    return masks
+
+def thin(mask:np.ndarray) -> np.ndarray:
+    """ function to thin a binary mask to a one pixel wide skeleton
+    args: (1) mask: bool array to thin
+    rets: (1) skeleton: bool array of the same shape
+    note: Zhang-Suen thinning, evaluated on the remaining foreground
+          pixels only, so each pass costs time linear in the road area """
+
+    img = np.pad(mask, 1).astype(np.uint8)                              # pad so neighbours always exist
+    w = img.shape[1]                                                    # padded row length
+    flat = img.ravel()                                                  # flat view for fancy indexing
+    # P2..P9, clockwise from north
+    offsets = np.array([-w, -w+1, 1, w+1, w, w-1, -1, -w-1])
+    fg = np.flatnonzero(flat)                                           # foreground pixels
+    changed = True
+    while changed:                                                      # until nothing is removed
+        changed = False
+        for step in range(2):                                           # two sub-iterations
+            P = flat[fg[:, None] + offsets]                             # neighbourhood of each pixel
+            B = P.sum(axis=1)                                           # number of foreground neighbours
+            A = ((P == 0) & (np.roll(P, -1, axis=1) == 1)).sum(axis=1)  # 0 -> 1 transitions around it
+            if step == 0:                                               # south-east boundary
+                c = (P[:, 0]*P[:, 2]*P[:, 4] == 0) & (P[:, 2]*P[:, 4]*P[:, 6] == 0)
+            else:                                                       # north-west boundary
+                c = (P[:, 0]*P[:, 2]*P[:, 6] == 0) & (P[:, 0]*P[:, 4]*P[:, 6] == 0)
+            remove = (B >= 2) & (B <= 6) & (A == 1) & c                 # deletable pixels
+            if remove.any():                                            # something to delete
+                flat[fg[remove]] = 0                                    # delete them
+                fg = fg[~remove]                                        # keep the rest
+                changed = True
+    return img[1:-1, 1:-1].astype(bool)
+
+def trace(skeleton:np.ndarray, direction:str="east", gap:float=5) -> np.ndarray:
+    """ function to walk a skeleton from one end to the other
+    args: (1) skeleton: bool array containing a one pixel wide road
+          (2) direction: str starting direction of the path, which picks
+                         the start among the road's endpoints
+          (3) gap: float largest break in the road to jump over
+    rets: (1) xy: int array containing the path coordinates, in order
+    note: each connected piece of road is walked as a trail, going
+          straight on at junctions and crossings, so that loops and
+          self-crossings are followed rather than cut out, until no
+          untravelled branch is left; the walk then jumps to the
+          nearest endpoint of another piece when it is within gap
+          pixels of the current end """
+
+    img = np.pad(skeleton, 1).astype(np.uint8)                          # pad so neighbours always exist
+    w = img.shape[1]                                                    # padded row length
+    flat = img.ravel()                                                  # flat view
+    px = np.flatnonzero(flat)                                           # skeleton pixels
+    if len(px) == 0:                                                    # no road
+        return np.zeros((0, 2), dtype=np.int64)
+    adjacency = _adjacency(flat, px, w)                                 # neighbours of each pixel
+    degree = np.array([len(adjacency[p]) for p in px.tolist()])         # number of neighbours
+    ends = px[degree <= 1]                                              # endpoints and isolated pixels
+    _, labels = cv2.connectedComponents(img, connectivity=8)            # pieces of road
+    labels = labels.ravel()                                             # flat view
+
+    candidates = ends if len(ends) else px                              # loops have no endpoints
+    start = int(candidates[_start_index(candidates % w, candidates // w, direction)])
+    index = GridIndex(np.c_[ends % w, ends // w])                       # endpoints to jump to
+    alive = np.ones(len(ends), bool)                                    # endpoints still in the index
+
+    graph = _Graph(adjacency, w)                                        # junctions and branches
+    route = []                                                          # walked pixels
+    while True:
+        route.extend(graph.walk(start))                                 # cross this piece of road
+        done = np.flatnonzero(alive & (labels[ends] == labels[start]))  # endpoints of this piece
+        for i in done:                                                  # no longer reachable
+            index.remove(int(i))
+        alive[done] = False
+        if not len(index):                                              # no pieces left
+            break
+        x, y = route[-1] % w, route[-1] // w                            # current end
+        nxt = index.nearest(x, y)                                       # closest other piece
+        if (ends[nxt] % w - x)**2 + (ends[nxt] // w - y)**2 > gap**2:   # too far to be the same road
+            break
+        start = int(ends[nxt])                                          # continue from there
+    route = np.array(route)                                             # flat padded indices
+    return np.c_[route % w - 1, route // w - 1]                         # unpadded xy coordinates
+
+def extract_routes(image:np.ndarray, colors:dict, direction:str="east", gap:float=5) -> dict:
+    """ function to extract several color-keyed routes from one road image
+    args: (1) image: RGB array containing the routes
+          (2) colors: dict of name -> [r, g, b] color of each route
+          (3) direction: str starting direction of the routes
+          (4) gap: float largest break in a road to jump over
+    rets: (1) routes: dict of name -> int array of path coordinates """
+
+    routes = {}                                                         # extracted routes
+    for name, mask in color_masks(image, colors).items():               # one pass for all colors
+        rows, cols = np.nonzero(mask.any(axis=1))[0], np.nonzero(mask.any(axis=0))[0]
+        if len(rows) == 0:                                              # color not in the image
+            routes[name] = np.zeros((0, 2), dtype=np.int64)
+            continue
+        y0, x0 = rows[0], cols[0]                                       # crop to the route's extent
+        crop = mask[y0:rows[-1]+1, x0:cols[-1]+1]                       # so thinning skips empty map
+        routes[name] = trace(thin(crop), direction, gap) + [x0, y0]     # back to map coordinates
+    return routes
+
+def _start_index(x:np.ndarray, y:np.ndarray, direction:str) -> int:
+    """ function to pick the starting pixel for a starting direction
+    args: (1) x: int array of candidate columns
+          (2) y: int array of candidate rows
+          (3) direction: str "north", "east", "south" or "west"
+    rets: (1) idx: int index of the starting candidate """
+
+    direction = direction.lower()                                       # case-insensitive setting
+    if direction == "north":                                            # moving north
+        return int(np.argmax(y))                                        # bottommost point
+    if direction == "south":                                            # moving south
+        return int(np.argmin(y))                                        # topmost point
+    if direction == "west":                                             # moving west
+        return int(np.argmax(x))                                        # rightmost point
+    return int(np.argmin(x))                                            # leftmost point, also by default
+
+def _adjacency(flat:np.ndarray, px:np.ndarray, w:int) -> dict:
+    """ function to list the neighbours of every skeleton pixel
+    args: (1) flat: flat uint8 array of the padded skeleton
+          (2) px: int array of flat indices of the skeleton pixels
+          (3) w: int width of the padded skeleton
+    rets: (1) adjacency: dict of pixel -> list of neighbouring pixels
+    note: a diagonal neighbour is skipped when a pixel next to both
+          already joins them, so that staircase corners do not form
+          small triangles that would look like junctions """
+
+    straight = np.array([-w, 1, w, -1])                                 # 4-neighbours, clockwise from north
+    on = flat[px[:, None] + straight].astype(bool)                      # 4-neighbours present
+    links = [px[:, None] + straight]                                    # candidate neighbours
+    masks = [on]
+    for i in range(4):                                                  # diagonals between straight pairs
+        j = (i + 1) % 4                                                 # next straight neighbour
+        diagonal = px + straight[i] + straight[j]                       # diagonal neighbour
+        links.append(diagonal[:, None])
+        masks.append((flat[diagonal].astype(bool) & ~on[:, i] & ~on[:, j])[:, None])
+    links, masks = np.hstack(links), np.hstack(masks)                   # all 8 neighbours
+    return {p: links[k][masks[k]].tolist() for k, p in enumerate(px.tolist())}
+
+class _Graph:
+
+    # class constructor
+
+    def __init__(self, adjacency:dict, w:int, reach:int=5, spur:int=10) -> None:
+        """ a skeleton seen as junctions and endpoints joined by branches,
+        which are traced the first time the walk reaches them
+        args: (1) adjacency: dict of pixel -> list of neighbouring pixels
+              (2) w: int width of the padded skeleton
+              (3) reach: int pixels along a branch that give its direction
+              (4) spur: int length of the longest dead-end branch off a
+                        junction that is a thinning artefact, not road """
+
+        # private class members
+
+        self._adjacency = adjacency                                     # neighbours of each pixel
+        self._w = w                                                     # row length of flat indices
+        self._reach = reach                                             # direction estimate length
+        self._spur = spur                                               # longest ignored dead end
+        self._node = {}                                                 # junction pixel -> node id
+        self._members = {}                                              # node id -> junction pixels
+        self._branches = []                                             # list of branch pixel lists
+        self._ends = {}                                                 # node id -> list of (branch, reversed)
+        self._expanded = set()                                          # nodes whose branches are traced
+        self._traced = set()                                            # (pixel, next pixel) steps traced
+        self._used = set()                                              # branches already walked
+
+    # public methods
+
+    def walk(self, start:int) -> list:
+        """ method to walk from a pixel along untravelled branches
+        args: (1) start: int flat index of the first pixel
+        rets: (1) walk: list of flat indices, in walking order
+        note: at each junction the walk takes the untravelled branch
+              that turns the least; where none is left, it goes back
+              over travelled branches to the closest junction that still
+              has one (road shared by two stretches of the route), and
+              it stops when no untravelled branch is left at all """
+
+        node = self._node_of(start, force=True)                         # starting node
+        walk, heading = [start], None                                   # walked pixels and direction
+        while True:
+            options = self._options(node)                               # untravelled branches from here
+            if not options:                                             # dead end or all travelled
+                detour = self._detour(node)                             # way back to untravelled road
+                if detour is None:                                      # nothing left to walk
+                    return walk
+                for branch in detour:                                   # travel it again
+                    walk.extend(branch[1:] if branch[0] == walk[-1] else branch)
+                    heading = -self._direction(branch[::-1])            # arrival direction
+                node = self._node_of(walk[-1])                          # node reached
+                continue
+            b, r = max(options, key=lambda o: self._straightness(heading, *o))
+            self._used.add(b)                                           # walk it
+            branch = self._branch(b, r)                                 # in walking order
+            walk.extend(branch[1:] if branch[0] == walk[-1] else branch)
+            heading = -self._direction(branch[::-1])                    # arrival direction
+            node = self._node_of(branch[-1])                            # node reached
+
+    # private methods
+
+    def _branch(self, b:int, r:bool) -> list:
+        """ method to get a branch's pixels, reversed if walked backwards """
+
+        return self._branches[b][::-1] if r else self._branches[b]
+
+    def _options(self, node:int) -> list:
+        """ method to list the untravelled branches leaving a node, apart
+        from short dead ends off a junction """
+
+        options = []                                                    # list of (branch, reversed)
+        for b, r in self._ends_of(node):                                # branches leaving this node
+            branch = self._branch(b, r)                                 # in walking order
+            spur = (len(branch) <= self._spur                           # short
+                    and len(self._adjacency[branch[0]]) > 1             # off a junction
+                    and len(self._adjacency[branch[-1]]) <= 1)          # to a dead end
+            if b not in self._used and not spur:                        # worth walking
+                options.append((b, r))
+        return options
+
+    def _detour(self, node:int):
+        """ method to find the shortest way over travelled branches to a
+        node that still has untravelled ones
+        args: (1) node: int id of the current node
+        rets: (1) detour: list of branch pixel lists in walking order, or
+                          None if no untravelled branch can be reached """
+
+        best = {node: 0}                                                # shortest distance to each node
+        previous = {node: None}                                         # (node, branch pixels) before
+        queue = [(0, node)]                                             # nodes to expand, closest first
+        while queue:
+            d, n = heapq.heappop(queue)
+            if d > best[n]:                                             # outdated entry
+                continue
+            if n != node and self._options(n):                          # untravelled road here
+                detour = []                                             # branches back to the start
+                while previous[n] is not None:
+                    n, branch = previous[n]
+                    detour.append(branch)
+                return detour[::-1]
+            for b, r in self._ends_of(n):                               # travelled branches
+                if b not in self._used:
+                    continue
+                branch = self._branch(b, r)                             # in walking order
+                m = self._node_of(branch[-1])                           # node it leads to
+                if d + len(branch) < best.get(m, float("inf")):         # shorter way there
+                    best[m] = d + len(branch)
+                    previous[m] = (n, branch)
+                    heapq.heappush(queue, (best[m], m))
+        return None
+
+    def _is_node(self, p:int) -> bool:
+        """ method to tell junctions and endpoints from plain road pixels """
+
+        return len(self._adjacency[p]) != 2 or p in self._node          # or a forced node
+
+    def _node_of(self, p:int, force:bool=False) -> int:
+        """ method to get the node a pixel belongs to, grouping adjacent
+        junction pixels into a single node
+        args: (1) p: int flat index of the pixel
+              (2) force: bool to make a plain road pixel a node, to start
+                         a walk on a loop
+        rets: (1) node: int id of the node """
+
+        if p in self._node:                                             # seen before
+            return self._node[p]
+        if len(self._adjacency[p]) != 2 or force:                       # endpoint, junction or start
+            members, queue = [p], deque([p])                            # junction pixels of this node
+            self._node[p] = p
+            while queue and len(self._adjacency[p]) > 2:                # grow junctions only
+                for q in self._adjacency[queue.popleft()]:              # neighbouring pixels
+                    if q not in self._node and len(self._adjacency[q]) > 2:
+                        self._node[q] = p                               # same junction
+                        members.append(q)
+                        queue.append(q)
+            self._members[p] = members
+        return self._node[p]
+
+    def _ends_of(self, node:int) -> list:
+        """ method to list the branches leaving a node, tracing them on first use """
+
+        if node not in self._expanded:                                  # not traced yet
+            self._expanded.add(node)
+            for p in self._members[node]:                               # junction pixels
+                for q in self._adjacency[p]:                            # leaving steps
+                    if self._node.get(q) != node and (p, q) not in self._traced:
+                        self._trace_branch(p, q)
+        return self._ends.get(node, [])
+
+    def _trace_branch(self, p:int, q:int) -> None:
+        """ method to follow a branch from a node pixel to the next node """
+
+        branch = [p]                                                    # branch pixels
+        while True:
+            self._traced.update([(p, q), (q, p)])                       # step traced both ways
+            branch.append(q)
+            if self._is_node(q):                                        # reached a node
+                break
+            p, q = q, next(n for n in self._adjacency[q] if n != p)     # plain road continues
+        b = len(self._branches)                                         # branch id
+        self._branches.append(branch)
+        self._ends.setdefault(self._node_of(branch[0]), []).append((b, False))
+        self._ends.setdefault(self._node_of(branch[-1]), []).append((b, True))
+
+    def _direction(self, branch:list) -> np.ndarray:
+        """ method to estimate the unit direction a branch leaves its first pixel """
+
+        a, b = branch[0], branch[min(self._reach, len(branch) - 1)]     # first pixel and a few along
+        v = np.array([b % self._w - a % self._w, b // self._w - a // self._w], float)
+        n = np.linalg.norm(v)
+        return v/n if n else v
+
+    def _straightness(self, heading, b:int, r:bool) -> float:
+        """ method to score how straight on a branch continues a heading """
+
+        if heading is None:                                             # nowhere to come from
+            return len(self._branches[b])                               # prefer the longest branch
+        return float(heading @ self._direction(self._branch(b, r)))     # cosine of the turn
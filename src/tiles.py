@@ -0,0 +1,282 @@
+import os
+import json
+import tempfile
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+def crop_array(matrix:np.ndarray, x0:int, y0:int, w:int, h:int, fill:int=255) -> np.ndarray:
+    """ function to crop a window out of an array, padding outside its bounds
+    args: (1) matrix: array to crop from
+          (2) x0: int left column of the window
+          (3) y0: int top row of the window
+          (4) w: int width of the window
+          (5) h: int height of the window
+          (6) fill: int value of the pixels outside the array
+    rets: (1) window: array of shape (h, w, ...) """
+
+    window = np.full((h, w) + matrix.shape[2:], fill, matrix.dtype)     # padded window
+    sx0, sy0 = max(x0, 0), max(y0, 0)                                   # top-left inside the array
+    sx1 = min(x0 + w, matrix.shape[1])                                  # right edge inside the array
+    sy1 = min(y0 + h, matrix.shape[0])                                  # bottom edge inside the array
+    if sx1 > sx0 and sy1 > sy0:                                         # window overlaps the array
+        window[sy0-y0:sy1-y0, sx0-x0:sx1-x0] = matrix[sy0:sy1, sx0:sx1] # copy overlapping part
+    return window
+
+class TiledMap:
+
+    # class constructor
+
+    def __init__(self, filename:str, prefix:str, tile:int=512, lru:int=64,
+                 pyramid:bool=True) -> None:
+        """ a map bitmap stored as memory-mapped tiles, optionally with a
+        pyramid of downsampled levels, which are only read when a window
+        overlapping them is requested
+        args: (1) filename: str containing the name of the image file
+              (2) prefix: str containing the path prefix of the tile files
+              (3) tile: int width and height of each tile, in pixels
+              (4) lru: int number of decoded tiles to keep in memory
+              (5) pyramid: bool to build downsampled levels
+        note: the image is decoded once, the first time a given prefix
+              is used, and every later run only maps the tile files """
+
+        # private class members
+
+        self._prefix = prefix                                           # tile files prefix
+        self._tile = tile                                               # tile size
+        self._lru = lru                                                 # tile cache capacity
+        self._shapes = self._build(filename, pyramid)                   # height and width of each level
+        self._levels = None                                             # memory-mapped levels, opened lazily
+        self._cache = OrderedDict()                                     # (level, ty, tx) -> tile
+        self._lock = threading.Lock()                                   # cache is shared by render threads
+
+    # public methods
+
+    def level_for(self, scale:float) -> int:
+        """ method to choose the pyramid level for a rendering scale
+        args: (1) scale: float output pixels per full resolution map pixel
+        rets: (1) level: int coarsest level that is not magnified less
+                         than the full resolution map would be """
+
+        level = int(np.floor(np.log2(1/scale))) if scale < 1 else 0     # each level halves the resolution
+        return min(level, len(self._shapes) - 1)
+
+    def overview(self) -> np.ndarray:
+        """ method to read the whole map at the coarsest pyramid level
+        args: none
+        rets: (1) image: RGB array of the coarsest level """
+
+        rows, cols = self._shapes[-1]                                   # coarsest level size
+        return self.crop(len(self._shapes) - 1, 0, 0, cols, rows)
+
+    def crop(self, level:int, x0:int, y0:int, w:int, h:int) -> np.ndarray:
+        """ method to assemble a window of a pyramid level from its tiles
+        args: (1) level: int pyramid level (0 for full resolution)
+              (2) x0: int left column of the window
+              (3) y0: int top row of the window
+              (4) w: int width of the window
+              (5) h: int height of the window
+        rets: (1) window: RGB array of shape (h, w, 3), white outside the map """
+
+        T = self._tile                                                  # tile size
+        rows, cols = self._shapes[level]                                # level size
+        window = np.full((h, w, 3), 255, np.uint8)                      # white outside the map
+        for ty in range(max(y0, 0)//T, min(y0 + h - 1, rows - 1)//T + 1):# tile rows in the window
+            for tx in range(max(x0, 0)//T, min(x0 + w - 1, cols - 1)//T + 1):
+                tile = self._get_tile(level, ty, tx)                    # tile contents
+                ys, xs = max(ty*T, y0), max(tx*T, x0)                   # overlap top-left
+                ye = min((ty + 1)*T, y0 + h, rows)                      # overlap bottom
+                xe = min((tx + 1)*T, x0 + w, cols)                      # overlap right
+                window[ys-y0:ye-y0, xs-x0:xe-x0] = tile[ys-ty*T:ye-ty*T, xs-tx*T:xe-tx*T]
+        return window
+
+    # private methods
+
+    def _build(self, filename:str, pyramid:bool) -> list:
+        """ method to write the tile files of every level, unless they exist
+        args: (1) filename: str containing the name of the image file
+              (2) pyramid: bool to build downsampled levels
+        rets: (1) shapes: list of [height, width] of each level """
+
+        meta = f"{self._prefix}.json"                                   # written last, marks completion
+        if os.path.exists(meta):                                        # tiles built before
+            with open(meta, 'r') as file:                               # open file in read
+                return json.load(file)                                  # load level shapes
+
+        image = cv2.imread(filename)                                    # decode image once
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)               # in place, no second copy
+        rows, cols = image.shape[:2]                                    # full resolution size
+        tiles = self._write_level(0, rows, cols,                        # full resolution tiles
+                                  lambda y0, y1: image[y0:y1])
+        del image                                                       # only the tile files from now on
+        shapes = [[rows, cols]]                                         # level shapes
+        while pyramid and max(rows, cols) > self._tile:                 # levels still larger than a tile
+            half = lambda y0, y1, tiles=tiles, rows=rows, cols=cols: self._halve(
+                tiles, rows, cols, 2*y0, 2*y1)                          # rows of the halved level
+            rows, cols = -(-rows//2), -(-cols//2)                       # halved level size
+            tiles = self._write_level(len(shapes), rows, cols, half)    # downsampled from the previous file
+            shapes.append([rows, cols])                                 # record level size
+        del tiles                                                       # unmap the last level
+
+        fd, temp = tempfile.mkstemp(suffix=".tmp",                      # private temporary file
+                                    dir=os.path.dirname(self._prefix) or ".")
+        with os.fdopen(fd, 'w') as file:                                # open file in write
+            json.dump(shapes, file)                                     # save level shapes
+        os.replace(temp, meta)                                          # publish it atomically
+        return shapes
+
+    def _write_level(self, level:int, rows:int, cols:int, band) -> np.ndarray:
+        """ method to write the tile file of a level, one row of tiles at a time
+        args: (1) level: int pyramid level
+              (2) rows: int height of the level
+              (3) cols: int width of the level
+              (4) band: function returning the RGB rows y0 to y1 of the level
+        rets: (1) tiles: read-only memory map of the written tiles
+        note: only one row of tiles is ever held in memory, and only the
+              tiles on the bottom and right edges are padded """
+
+        T = self._tile                                                  # tile size
+        ny, nx, full = -(-rows//T), -(-cols//T), cols//T                # tiles, and tiles without padding
+        fd, temp = tempfile.mkstemp(suffix=".tmp",                      # private temporary file
+                                    dir=os.path.dirname(self._prefix) or ".")
+        os.close(fd)                                                    # reopened as a memory map
+        tiles = np.lib.format.open_memmap(temp, mode="w+", dtype=np.uint8,
+                                          shape=(ny, nx, T, T, 3))      # each tile is contiguous on disk
+        for ty in range(ny):                                            # iterate over rows of tiles
+            strip = band(ty*T, min((ty + 1)*T, rows))                   # image rows of this tile row
+            h = len(strip)                                              # T, except on the bottom edge
+            tiles[ty, :full, :h] = strip[:, :full*T].reshape(           # whole tiles, tile-major
+                h, full, T, 3).swapaxes(0, 1)
+            tiles[ty, :full, h:] = 255                                  # white below the map
+            if full < nx:                                               # partial tile on the right edge
+                tiles[ty, full] = crop_array(strip, full*T, 0, T, T)    # padded with white
+        tiles.flush()                                                   # write everything to disk
+        del tiles                                                       # close the memory map
+        os.replace(temp, self._level_file(level))                       # publish level
+        return np.load(self._level_file(level), mmap_mode="r")
+
+    def _halve(self, tiles:np.ndarray, rows:int, cols:int, y0:int, y1:int) -> np.ndarray:
+        """ method to downsample a band of a level to half its resolution
+        args: (1) tiles: memory-mapped tiles of the level
+              (2) rows: int height of the level
+              (3) cols: int width of the level
+              (4) y0: int first row of the band, which is even
+              (5) y1: int row after the band
+        rets: (1) band: RGB array of rows y0//2 to y1//2 of the next level """
+
+        T = self._tile                                                  # tile size
+        ty0, ty1 = y0//T, -(-min(y1, rows)//T)                          # tile rows covering the band
+        strip = tiles[ty0:ty1].swapaxes(1, 2).reshape(-1, tiles.shape[1]*T, 3)# read those tiles as rows
+        strip = crop_array(strip[y0-ty0*T:min(y1, rows)-ty0*T, :cols],  # the band, inside the map
+                           0, 0, cols + cols%2, -(-(min(y1, rows) - y0)//2)*2)# padded to even size
+        return cv2.resize(strip, (strip.shape[1]//2, strip.shape[0]//2),# halve resolution exactly
+                          interpolation=cv2.INTER_AREA)                 # averaging pixels
+
+    def _level_file(self, level:int) -> str:
+        """ method to get the tile file name of a level """
+
+        return f"{self._prefix}_L{level}.npy"
+
+    def _get_tile(self, level:int, ty:int, tx:int) -> np.ndarray:
+        """ method to read a tile through the LRU cache
+        args: (1) level: int pyramid level
+              (2) ty: int tile row
+              (3) tx: int tile column
+        rets: (1) tile: RGB array of shape (tile, tile, 3) """
+
+        key = (level, ty, tx)                                           # cache key
+        with self._lock:                                                # one thread at a time
+            if key in self._cache:                                      # recently used tile
+                self._cache.move_to_end(key)                            # mark as most recent
+                return self._cache[key]
+            if self._levels is None:                                    # first read
+                self._levels = [np.load(self._level_file(n), mmap_mode="r")
+                                for n in range(len(self._shapes))]      # map every level without reading it
+            tile = np.array(self._levels[level][ty, tx])                # read one tile from disk
+            self._cache[key] = tile                                     # keep it
+            if len(self._cache) > self._lru:                            # cache is full
+                self._cache.popitem(last=False)                         # evict least recent tile
+            return tile
+
+    def __getstate__(self) -> dict:
+        """ method to pickle only the tile file locations, for worker processes """
+
+        state = self.__dict__.copy()                                    # instance members
+        state["_levels"], state["_cache"] = None, OrderedDict()         # reopened lazily
+        del state["_lock"]                                              # locks cannot be pickled
+        return state
+
+    def __setstate__(self, state:dict) -> None:
+        """ method to restore a pickled map with a fresh cache lock """
+
+        self.__dict__.update(state)
+        self._lock = threading.Lock()                                   # this process's own lock
+
+class TileLayer:
+
+    # class constructor
+
+    def __init__(self, tile:int=256) -> None:
+        """ a sparse single channel layer, stored as the tiles that have
+        been drawn on, for trails over arbitrarily large maps
+        args: (1) tile: int width and height of each tile, in pixels """
+
+        # private class members
+
+        self._tile = tile                                               # tile size
+        self._tiles = {}                                                # (ty, tx) -> uint8 tile
+
+    # public methods
+
+    def polyline(self, pts:np.ndarray, thickness:int) -> None:
+        """ method to draw an anti-aliased polyline on the layer
+        args: (1) pts: array containing the polyline coordinates
+              (2) thickness: int line width, in pixels
+        rets: none
+        note: each segment is drawn on its own and merged with the
+              coverage drawn so far by taking the maximum, so that edges
+              are never blended twice, and drawing a path in several
+              calls gives exactly the same layer as drawing it at once """
+
+        T = self._tile                                                  # tile size
+        r = thickness/2 + 2                                             # reach of the line around its points
+        a, b = pts[:-1], pts[1:]                                        # segment ends
+        lo = np.floor(np.minimum(a, b) - r).astype(int)                 # segment patches top-left
+        hi = np.ceil(np.maximum(a, b) + r).astype(int) + 1              # segment patches bottom-right
+        ends = np.round((np.stack([a, b], axis=1) - lo[:, None])*16).astype(np.int32)
+        for (x0, y0), (x1, y1), local in zip(lo.tolist(), hi.tolist(), ends):
+            patch = np.zeros((y1 - y0, x1 - x0), np.uint8)              # blank scratch patch
+            cv2.line(patch, local[0], local[1], color=255,              # draw in patch coordinates
+                     thickness=thickness, lineType=cv2.LINE_AA,         # anti-aliased like matplotlib
+                     shift=4)                                           # 4-bit sub-pixel fixed point
+            for ty in range(y0//T, (y1 - 1)//T + 1):                    # tile rows under the patch
+                for tx in range(x0//T, (x1 - 1)//T + 1):                # tile columns under the patch
+                    ys, xs = max(ty*T, y0), max(tx*T, x0)               # overlap top-left
+                    ye, xe = min((ty + 1)*T, y1), min((tx + 1)*T, x1)   # overlap bottom-right
+                    part = patch[ys-y0:ye-y0, xs-x0:xe-x0]              # segment coverage in this tile
+                    if not part.any():                                  # segment misses this tile
+                        continue
+                    tile = self._tiles.setdefault((ty, tx), np.zeros((T, T), np.uint8))
+                    region = tile[ys-ty*T:ye-ty*T, xs-tx*T:xe-tx*T]     # tile pixels under the patch
+                    np.maximum(region, part, out=region)                # merge without re-blending
+
+    def crop(self, x0:int, y0:int, w:int, h:int) -> np.ndarray:
+        """ method to assemble a window of the layer
+        args: (1) x0: int left column of the window
+              (2) y0: int top row of the window
+              (3) w: int width of the window
+              (4) h: int height of the window
+        rets: (1) window: uint8 array of shape (h, w), 0 where not drawn """
+
+        T = self._tile                                                  # tile size
+        window = np.zeros((h, w), np.uint8)                             # blank window
+        for ty in range(y0//T, (y0 + h - 1)//T + 1):                    # tile rows in the window
+            for tx in range(x0//T, (x0 + w - 1)//T + 1):                # tile columns in the window
+                tile = self._tiles.get((ty, tx))                        # drawn tile, if any
+                if tile is None:                                        # nothing drawn here
+                    continue
+                ys, xs = max(ty*T, y0), max(tx*T, x0)                   # overlap top-left
+                ye, xe = min((ty + 1)*T, y0 + h), min((tx + 1)*T, x0 + w)
+                window[ys-y0:ye-y0, xs-x0:xe-x0] = tile[ys-ty*T:ye-ty*T, xs-tx*T:xe-tx*T]
+        return window
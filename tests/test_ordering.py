@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from src.ordering import GridIndex, nearest_neighbour_order
+
+def greedy_order(xy:np.ndarray, start:int=0) -> np.ndarray:
+    """ reference copy of the original O(n^2) closest-neighbour loop """
+
+    dist = lambda pt, pts:np.sqrt(                                      # function to calculate distance
+        (pt[0] - pts[:,0])**2 + (pt[1] - pts[:,1])**2)                  # euclidean distance between points
+
+    xy_out = np.array([xy[start]])                                      # output list of coordinates
+    pt = xy_out[-1]                                                     # reference point
+    rem = np.delete(xy, start, axis=0)                                  # copy of remaining points
+    while len(rem) > 0:                                                 # iterate over input list of coordinates
+        closest_idx = np.argmin(dist(pt, rem))                          # identify the closest neighbor
+        pt = rem[closest_idx]                                           # store it for next iteration
+        xy_out = np.concatenate((xy_out, [pt]), axis=0)                 # append to list of output points
+        rem = np.delete(rem, closest_idx, axis=0)                       # remove it from the remaining points list
+    return xy_out
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("n, span", [(50, 10), (500, 40), (2000, 2000)])
+def test_integer_points(seed, n, span):
+    rng = np.random.default_rng(seed)
+    xy = np.unique(rng.integers(0, span, (n, 2)), axis=0)               # dense grids are full of ties
+    rng.shuffle(xy)
+    start = int(rng.integers(len(xy)))
+    np.testing.assert_array_equal(xy[nearest_neighbour_order(xy, start)], greedy_order(xy, start))
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("n, span", [(100, 1.0), (1000, 500.0)])
+def test_float_points(seed, n, span):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(-span, span, (n, 2))
+    start = int(rng.integers(n))
+    np.testing.assert_array_equal(xy[nearest_neighbour_order(xy, start)], greedy_order(xy, start))
+
+def test_lattice_ties():
+    xs, ys = np.meshgrid(np.arange(12), np.arange(9))                   # every hop is a tie
+    xy = np.stack([xs.ravel(), ys.ravel()], axis=1)
+    for start in [0, 5, len(xy)//2, len(xy) - 1]:
+        np.testing.assert_array_equal(xy[nearest_neighbour_order(xy, start)], greedy_order(xy, start))
+
+def test_equidistant_ties_take_lowest_index():
+    xy = np.array([[0, 0], [0, 3], [3, 0], [0, -3], [-3, 0]])
+    np.testing.assert_array_equal(nearest_neighbour_order(xy), [0, 1, 2, 3, 4])
+
+def test_single_point():
+    np.testing.assert_array_equal(nearest_neighbour_order(np.array([[7, 3]])), [0])
+
+def test_empty_remainder():
+    index = GridIndex(np.array([[1.0, 2.0], [4.0, 6.0]]))
+    assert index.nearest(0, 0) == 0
+    index.remove(0)
+    index.remove(1)
+    assert len(index) == 0
+    assert index.nearest(0, 0) == -1
+
+def test_removed_points_are_skipped():
+    rng = np.random.default_rng(0)
+    xy = rng.integers(0, 100, (300, 2))
+    index = GridIndex(xy)
+    alive = np.ones(len(xy), bool)
+    for idx in rng.permutation(len(xy))[:250]:                          # remove most points
+        index.remove(idx)
+        alive[idx] = False
+    for x, y in rng.uniform(-20, 120, (50, 2)):                         # queries inside and outside
+        d = np.where(alive, (xy[:,0] - x)**2 + (xy[:,1] - y)**2, np.inf)
+        assert index.nearest(x, y) == np.argmin(d)
@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+import pytest
+from src.skeleton import extract_routes, thin, trace
+
+def draw(shape:tuple, *polylines, thickness:int=1) -> np.ndarray:
+    """ helper to draw open polylines on an empty mask """
+
+    mask = np.zeros(shape, np.uint8)
+    for pts in polylines:
+        cv2.polylines(mask, [np.array(pts, np.int32)], False, 1, thickness)
+    return mask.astype(bool)
+
+def steps(route:np.ndarray) -> int:
+    """ helper to measure the longest step of a route, in pixels per axis """
+
+    return int(np.abs(np.diff(route, axis=0)).max())
+
+def visits(route:np.ndarray, x:int, y:int) -> np.ndarray:
+    """ helper to list the positions of a pixel in a route """
+
+    return np.flatnonzero((route == [x, y]).all(axis=1))
+
+# east along y=80, up, west along y=30, then south across the first leg at (60, 80)
+CROSSING = [(10, 80), (150, 80), (150, 30), (60, 30), (60, 120)]
+
+def test_self_crossing_route_keeps_its_loop():
+    skeleton = draw((140, 200), CROSSING)
+    route = trace(skeleton, "east", 5)
+    assert tuple(route[0]) == (10, 80) and tuple(route[-1]) == (60, 120)
+    assert steps(route) == 1                                            # never jumps
+    assert {tuple(p) for p in route} == {tuple(p) for p in np.argwhere(skeleton)[:, ::-1]}
+    first, second = visits(route, 60, 80)                               # straight through the crossing twice
+    assert visits(route, 150, 30)[0] > first                            # the loop between both crossings
+    assert second > visits(route, 150, 30)[0]
+
+def test_self_crossing_thick_road_keeps_its_loop():
+    route = trace(thin(draw((140, 200), CROSSING, thickness=7)), "east", 5)
+    assert np.abs(route[0] - [10, 80]).max() <= 3
+    assert np.abs(route[-1] - [60, 120]).max() <= 3
+    assert route[:, 1].min() <= 31                                      # reaches the top of the loop
+    assert steps(route) == 1
+
+def test_t_junction_goes_straight_then_detours():
+    skeleton = draw((100, 100), [(10, 50), (90, 50)], [(50, 50), (50, 95)])
+    route = trace(skeleton, "east", 5)
+    assert tuple(route[0]) == (10, 50)
+    assert visits(route, 90, 50)[0] < visits(route, 50, 95)[0]         # straight on first
+    assert tuple(route[-1]) == (50, 95)                                 # then back to the side branch
+    assert steps(route) == 1
+    assert {tuple(p) for p in route} == {tuple(p) for p in np.argwhere(skeleton)[:, ::-1]}
+
+def test_gap_within_threshold_is_bridged():
+    skeleton = draw((40, 100), [(5, 20), (45, 20)], [(50, 20), (95, 20)])
+    route = trace(skeleton, "east", 5)
+    assert tuple(route[0]) == (5, 20) and tuple(route[-1]) == (95, 20)
+    assert len(route) == skeleton.sum()
+    assert steps(route) == 5                                            # the jump over the gap
+
+def test_gap_beyond_threshold_ends_the_route():
+    skeleton = draw((40, 100), [(5, 20), (40, 20)], [(50, 20), (95, 20)])
+    route = trace(skeleton, "east", 5)
+    assert tuple(route[0]) == (5, 20) and tuple(route[-1]) == (40, 20)
+
+def test_closed_loop_without_endpoints():
+    skeleton = np.zeros((100, 100), np.uint8)
+    cv2.circle(skeleton, (50, 50), 30, 1, 1)
+    skeleton = skeleton.astype(bool)
+    route = trace(skeleton, "east", 5)
+    assert tuple(route[0]) == (20, 50)                                  # leftmost pixel, heading east
+    assert steps(route) == 1
+    assert {tuple(p) for p in route} == {tuple(p) for p in np.argwhere(skeleton)[:, ::-1]}
+
+def test_empty_skeleton():
+    assert trace(np.zeros((10, 10), bool)).shape == (0, 2)
+
+def test_extract_routes_by_color():
+    image = np.full((100, 120, 3), 255, np.uint8)
+    cv2.line(image, (10, 20), (110, 20), (255, 0, 0), 3)
+    cv2.line(image, (10, 70), (110, 70), (0, 0, 255), 3)
+    routes = extract_routes(image, {"red": [255, 0, 0], "blue": [0, 0, 255.0],
+                                    "green": [0, 255, 0], "between": [0, 0, 254.5]})
+    for name, y in [("red", 20), ("blue", 70)]:
+        assert (routes[name][:, 1] == y).all()                          # map coordinates, not crop ones
+        assert routes[name][0, 0] < 15 and routes[name][-1, 0] > 105    # west to east
+        assert steps(routes[name]) == 1
+    for name in ["green", "between"]:                                   # absent colors
+        assert routes[name].shape == (0, 2)
+
+@pytest.mark.parametrize("direction, start", [("east", (10, 50)), ("west", (90, 50))])
+def test_starting_direction(direction, start):
+    route = trace(draw((100, 100), [(10, 50), (90, 50)]), direction, 5)
+    assert tuple(route[0]) == start